@@ -35,10 +35,15 @@
 # core
 from quantum.qobj import *
 from quantum.tensor import *
+from quantum.manifold import *
 from quantum.superoperator import *
 
 # evolution
+from quantum.trajectory import *
+from quantum.rhs_cache import *
+from quantum.frame import *
 from quantum.mesolve import *
+from quantum.spectrum import *
 #from quantum.propagator import *
 #from quantum.steadystate import *
 #from quantum.correlation import *
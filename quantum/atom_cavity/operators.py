@@ -34,10 +34,7 @@ quantum optics operators.
 
 __all__ = ['destroy_a', 'destroy_x', 'create_a', 'create_x', 'num_a', 'num_x']
 
-import numpy as np
-import scipy.sparse as sp
-from qutip.qobj import Qobj
-from quantum.tensor import kron_delta
+from quantum.manifold import destroy_mode
 
 
 def destroy_a(states):
@@ -54,13 +51,7 @@ def destroy_a(states):
     oper : qobj
         Qobj for destruction operator for photonic excitations.
     """
-    nstates = len(states)
-    a = np.eye(nstates)
-    for i in range(nstates):
-        for j in range(nstates):
-            a[i, j] = _destroy_photons(states[i, 0], states[i, 1], states[j, 0],
-            states[j, 1])
-    return Qobj(sp.csr_matrix(a, dtype=complex), isherm=False)
+    return destroy_mode(states, 1)
 
 
 
@@ -78,12 +69,7 @@ def destroy_x(states):
     oper : qobj
         Qobj for destruction operator for atomic excitations.
     """
-    nstates = len(states)
-    sigma = np.eye(nstates)
-    for i in range(nstates):
-        for j in range(nstates):
-            sigma[i,j] = _destroy_excitons(states[i,0],states[i,1],states[j,0],states[j,1])
-    return Qobj(sp.csr_matrix(sigma, dtype=complex), isherm=False)
+    return destroy_mode(states, 0)
 
 
 def create_a(states):
@@ -157,22 +143,3 @@ def num_x(states):
     sigmam = destroy_x(states)
     sigmap = sigmam.dag()
     return sigmap*sigmam
-
-
-#------------------------------------------------------------------------------
-# Internal functions
-#
-# DESTROY_PHOTONS works for the specific problem of the Jaynes-Cummings model.
-# Proper generalization must be done un the future.
-#
-def _destroy_photons(alpha, m, beta, n):
-    dp = np.sqrt(n) * kron_delta(alpha, beta) * kron_delta(m, n-1)
-    return dp
-
-#
-# DESTROY_EXCITONS works for the specific problem of the Jaynes-Cummings model.
-# Proper generalization must be done un the future.
-#
-def _destroy_excitons(alpha, m, beta, n):
-    dx = kron_delta(alpha, 0) * kron_delta(beta, 1) * kron_delta(m, n)
-    return  dx
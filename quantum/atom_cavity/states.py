@@ -37,6 +37,7 @@ __all__ = ['states', 'elements', 'kets']
 
 import numpy as np
 from qutip.states import basis
+from quantum.manifold import excitation_basis
 
 def states(N):
     """Generates an array with the states for the current problem.
@@ -60,13 +61,7 @@ def states(N):
     -------
     states : numpy array
     """
-    s = []
-    for n in range(N+1):
-        for j in range(n+1):
-            for i in range(2):
-                if (i + j == n):
-                    s.append((i,j))
-    return np.array(s)
+    return excitation_basis(N, [1, None])
 
 
 def elements(s):
@@ -36,10 +36,7 @@ __all__ = ['destroy_a_1', 'destroy_x_1', 'create_a_1', 'create_x_1', 'num_a_1',
 'num_x_1', 'destroy_a_2', 'destroy_x_2', 'create_a_2', 'create_x_2', 'num_a_2',
 'num_x_2']
 
-import numpy as np
-import scipy.sparse as sp
-from qutip.qobj import Qobj
-from quantum.tensor import kron_delta
+from quantum.manifold import destroy_mode
 
 
 #------------------------------------------------------------------------------
@@ -57,13 +54,7 @@ def destroy_a_1(states):
     oper : qobj
         Qobj for destruction operator for photonic excitations.
     """
-    nstates = len(states)
-    a = np.eye(nstates)
-    for i in range(nstates):
-        for j in range(nstates):
-            a[i, j] = _destroy_photons_1(states[i, 0], states[i, 1], states[i, 2],
-            states[i, 3], states[j, 0], states[j, 1], states[j, 2], states[j, 3])
-    return Qobj(sp.csr_matrix(a, dtype=complex), isherm=False)
+    return destroy_mode(states, 1)
 
 
 def destroy_x_1(states):
@@ -80,13 +71,7 @@ def destroy_x_1(states):
     oper : qobj
         Qobj for destruction operator for atomic excitations.
     """
-    nstates = len(states)
-    sigma = np.eye(nstates)
-    for i in range(nstates):
-        for j in range(nstates):
-            sigma[i,j] = _destroy_excitons_1(states[i, 0], states[i, 1], states[i, 2],
-            states[i, 3], states[j, 0], states[j, 1], states[j, 2], states[j, 3])
-    return Qobj(sp.csr_matrix(sigma, dtype=complex), isherm=False)
+    return destroy_mode(states, 0)
 #------------------------------------------------------------------------------
 
 
@@ -105,13 +90,7 @@ def destroy_a_2(states):
     oper : qobj
         Qobj for destruction operator for photonic excitations.
     """
-    nstates = len(states)
-    a = np.eye(nstates)
-    for i in range(nstates):
-        for j in range(nstates):
-            a[i, j] = _destroy_photons_2(states[i, 0], states[i, 1], states[i, 2],
-            states[i, 3], states[j, 0], states[j, 1], states[j, 2], states[j, 3])
-    return Qobj(sp.csr_matrix(a, dtype=complex), isherm=False)
+    return destroy_mode(states, 3)
 
 
 def destroy_x_2(states):
@@ -128,13 +107,7 @@ def destroy_x_2(states):
     oper : qobj
         Qobj for destruction operator for atomic excitations.
     """
-    nstates = len(states)
-    sigma = np.eye(nstates)
-    for i in range(nstates):
-        for j in range(nstates):
-            sigma[i,j] = _destroy_excitons_2(states[i, 0], states[i, 1], states[i, 2],
-            states[i, 3], states[j, 0], states[j, 1], states[j, 2], states[j, 3])
-    return Qobj(sp.csr_matrix(sigma, dtype=complex), isherm=False)
+    return destroy_mode(states, 2)
 #------------------------------------------------------------------------------
 
 
@@ -286,30 +259,3 @@ def num_x_2(states):
     sigmap = sigmam.dag()
     return sigmap*sigmam
 #------------------------------------------------------------------------------
-
-
-#------------------------------------------------------------------------------
-# Internal functions
-#
-def _destroy_photons_1(alpha, m, beta, n, alpha_p, m_p, beta_p, n_p):
-    dp = np.sqrt(m_p) * kron_delta(alpha, alpha_p) *  kron_delta(beta, beta_p) \
-    * kron_delta(m, m_p-1) * kron_delta(n, n_p)
-    return dp
-
-
-def _destroy_photons_2(alpha, m, beta, n, alpha_p, m_p, beta_p, n_p):
-    dp = np.sqrt(n_p) * kron_delta(alpha, alpha_p) *  kron_delta(beta, beta_p) \
-    * kron_delta(m, m_p) * kron_delta(n, n_p-1)
-    return dp
-
-
-def _destroy_excitons_1(alpha, m, beta, n, alpha_p, m_p, beta_p, n_p):
-    dx = kron_delta(alpha, 0) * kron_delta(alpha_p, 1) * kron_delta(beta, beta_p) \
-    * kron_delta(m, m_p) * kron_delta(n, n_p)
-    return  dx
-
-
-def _destroy_excitons_2(alpha, m, beta, n, alpha_p, m_p, beta_p, n_p):
-    dx = kron_delta(alpha, alpha_p) * kron_delta(beta, 0) * kron_delta(beta_p, 1) \
-    * kron_delta(m, m_p) * kron_delta(n, n_p)
-    return  dx
@@ -37,6 +37,7 @@ __all__ = ['states', 'elements', 'kets']
 
 import numpy as np
 from qutip.states import basis
+from quantum.manifold import excitation_basis
 
 def states(N):
     """Generates an array with the states for the current problem:
@@ -62,15 +63,7 @@ def states(N):
     
 
     """
-    s = []
-    for n in range(N+1):
-        for j in range(n+1):
-            for beta in range(2):
-                for i in range(n+1):
-                    for alpha in range(2):
-                        if (alpha+i+beta+j==n):
-                            s.append((alpha, i, beta, j))
-    return np.array(s)
+    return excitation_basis(N, [1, None, 1, None])
 
 # For Px truncation!
 # if (alpha+i+beta+j==n) and not ((n==N and (alpha==0 or beta==0))
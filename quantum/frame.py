@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# This file is part of Quantum.
+#
+#    Copyright (c) 2017, Diego Nicolás Bernal-García
+#    All rights reserved.
+#
+#    Redistribution and use in source and binary forms, with or without
+#    modification, are permitted provided that the following conditions are
+#    met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#
+#    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#    "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#    LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+#    PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#    HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#    LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#    THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#    (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#    OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+"""
+This module contains the functions used to solve the master equation in a
+frame rotating with a diagonal operator, such as the total number of
+excitations, which removes the fast bare frequencies from the dynamics.
+"""
+
+__all__ = ['rotating_frame']
+
+
+import numpy as np
+import scipy.sparse as sp
+from qutip.qobj import Qobj, isket, isoper, issuper
+from qutip.interpolate import Cubic_Spline
+
+# frequencies that agree to this number of decimals are merged into a single
+# time-dependent term
+_frequency_decimals = 8
+
+
+def rotating_frame(H, c_ops, frame):
+    """Transforms a master equation to the frame rotating with a diagonal
+    operator.
+
+    With R = `frame`, the density matrix in the rotating frame is
+    exp(iRt) rho exp(-iRt), which evolves with the Hamiltonian
+    exp(iRt) (H - R) exp(-iRt). Since R is diagonal, every element H_ij is
+    only multiplied by exp(i(R_ii - R_jj)t): the part of H that commutes with
+    R stays constant, without the frequencies of R, and the rest is returned
+    as time-dependent terms, one per frequency. The dissipators are invariant
+    if every collapse operator oscillates with a single frequency, as the
+    photon and emitter lowering operators do in the frame of the total
+    number of excitations.
+
+    Parameters
+    ----------
+    H : qobj / list
+        System Hamiltonian, constant or in list format with string or
+        function coefficients.
+
+    c_ops : list
+        List of collapse operators, constant or in list format.
+
+    frame : qobj
+        Hermitian operator, diagonal in the basis of the Hilbert space, that
+        defines the rotating frame, e.g. ``wc * excitation_number(states)``.
+
+    Returns
+    -------
+    H_rot, c_ops_rot : qobj / list, list
+        Hamiltonian and collapse operators in the rotating frame. The
+        Hamiltonian is a Qobj if it is constant in the rotating frame and is
+        in list format otherwise, with string coefficients unless the input
+        already has function coefficients.
+    """
+    r = _frame_frequencies(frame)
+    if isinstance(c_ops, Qobj):
+        c_ops = [c_ops]
+    funcs = _has_func_coeffs(H) or _has_func_coeffs(c_ops)
+
+    H_const = -frame
+    H_td = []
+    for term in (H if isinstance(H, list) else [H]):
+        op, coeff = _split_term(term)
+        for w, part in _split_frequencies(op, r):
+            if w == 0 and coeff is None:
+                H_const = H_const + part
+            else:
+                H_td.append([part, _rotate_coeff(coeff, w, funcs)])
+
+    for c in c_ops:
+        op, _ = _split_term(c)
+        if len(_split_frequencies(op, r)) > 1:
+            raise ValueError("The collapse operators must oscillate with a " +
+                             "single frequency in the rotating frame.")
+
+    return ([H_const] + H_td if H_td else H_const), list(c_ops)
+
+
+def _frame_frequencies(frame):
+    """
+    Diagonal of the operator that defines the rotating frame, checking that
+    it is a real diagonal operator.
+    """
+    if not isinstance(frame, Qobj) or not isoper(frame):
+        raise TypeError("The rotating frame must be defined by an operator.")
+    R = frame.data.tocoo()
+    if np.any(R.data[R.row != R.col]):
+        raise ValueError("The operator of the rotating frame must be " +
+                         "diagonal.")
+    r = R.diagonal()
+    if np.any(r.imag):
+        raise ValueError("The operator of the rotating frame must be " +
+                         "Hermitian.")
+    return r.real
+
+
+def _split_frequencies(op, r):
+    """
+    Split the operator into the parts A_w that oscillate with a single
+    frequency in the frame rotating with diag(r), i.e.
+    exp(iRt) A exp(-iRt) = sum_w A_w exp(iwt). Returns a list of (w, A_w).
+    """
+    A = op.data.tocoo()
+    nz = A.data != 0
+    rows, cols, data = A.row[nz], A.col[nz], A.data[nz]
+    w = np.round(r[rows] - r[cols], _frequency_decimals)
+    freqs, inv = np.unique(w, return_inverse=True)
+    parts = []
+    for k, f in enumerate(freqs):
+        keep = inv == k
+        part = sp.csr_matrix((data[keep], (rows[keep], cols[keep])),
+                             shape=A.shape)
+        parts.append((float(f), Qobj(part, dims=op.dims)))
+    return parts
+
+
+def _split_term(term):
+    """
+    Operator and coefficient (None for constant terms) of an element of a
+    Hamiltonian or collapse operator in list format.
+    """
+    if isinstance(term, Qobj):
+        op, coeff = term, None
+    elif (isinstance(term, list) and len(term) == 2 and
+          isinstance(term[0], Qobj)):
+        op, coeff = term
+    else:
+        raise TypeError("The rotating frame requires a constant or " +
+                        "list-format Hamiltonian and collapse operators.")
+    if issuper(op):
+        raise TypeError("The rotating frame requires a Hamiltonian and " +
+                        "collapse operators, not superoperators.")
+    return op, coeff
+
+
+def _has_func_coeffs(terms):
+    """
+    Whether a list-format operator has time-dependent terms with function
+    coefficients.
+    """
+    return isinstance(terms, list) and any(
+        isinstance(term, list) and len(term) == 2 and callable(term[1]) and
+        not isinstance(term[1], Cubic_Spline) for term in terms)
+
+
+def _rotate_coeff(coeff, w, funcs):
+    """
+    Coefficient of a term multiplied by exp(iwt), as a string or, if funcs
+    is True or the coefficient is a function, as a function.
+    """
+    if w == 0:
+        return coeff
+    if isinstance(coeff, Cubic_Spline):
+        raise TypeError("Cubic_Spline coefficients cannot be transformed " +
+                        "to the rotating frame.")
+    if coeff is None and not funcs:
+        return 'exp(1j*(%r)*t)' % w
+    if isinstance(coeff, str):
+        return '(%s)*exp(1j*(%r)*t)' % (coeff, w)
+
+    def rotating_coeff(t, args):
+        value = 1 if coeff is None else coeff(t, args)
+        return value * np.exp(1j * w * t)
+    return rotating_coeff
+
+
+def _lab_state(state, r, t):
+    """
+    Transform a state vector or density matrix from the frame rotating with
+    diag(r) to the laboratory frame at time t (with -r, the other way round).
+    """
+    u = np.exp(-1j * r * t)
+    if isket(state):
+        return Qobj(u[:, np.newaxis] * state.full(), dims=state.dims)
+    return Qobj(u[:, np.newaxis] * state.full() * u.conj(), dims=state.dims,
+                isherm=state.isherm)
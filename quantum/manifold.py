@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# This file is part of Quantum.
+#
+#    Copyright (c) 2017, Diego Nicolás Bernal-García
+#    All rights reserved.
+#
+#    Redistribution and use in source and binary forms, with or without
+#    modification, are permitted provided that the following conditions are
+#    met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#
+#    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#    "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#    LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+#    PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#    HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#    LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#    THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#    (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#    OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+"""
+This module contains the functions used to generate and index the states of
+a basis truncated by excitation manifold and to construct operators on it.
+"""
+
+__all__ = ['excitation_basis', 'basis_index', 'destroy_mode',
+           'excitation_number']
+
+
+import numpy as np
+import scipy.sparse as sp
+from qutip.qobj import Qobj
+
+
+def excitation_basis(N, modes):
+    """Generates the states of a system of two-level emitters and bosonic
+    modes truncated by the total number of excitations.
+
+    The states are built column by column with vectorized operations, keeping
+    only the partial occupations that do not exceed the maximum excitation
+    manifold, and are ordered by excitation manifold and then
+    lexicographically, starting from the last column. This reproduces the
+    ordering of the predefined bases in `quantum.atom_cavity.states` and
+    `quantum.coupled_cavities.states`.
+
+    Parameters
+    ----------
+    N : int
+        Maximum excitation manifold.
+
+    modes : list
+        Maximum occupation of every column of the basis: 1 for a two-level
+        emitter and None for a bosonic mode, which is only limited by `N`.
+        For instance, an array of cavities with one atom each is described
+        by ``[1, None] * nsites``.
+
+    Returns
+    -------
+    states : array
+        Integer array with one state per row and one column per mode.
+    """
+    s = np.zeros((1, 0), dtype=np.int32)
+    n = np.zeros(1, dtype=np.int32)
+    for cutoff in modes:
+        cutoff = N if cutoff is None else min(cutoff, N)
+        blocks = []
+        totals = []
+        for occupation in range(cutoff + 1):
+            keep = n + occupation <= N
+            column = np.full((np.count_nonzero(keep), 1), occupation,
+                             dtype=np.int32)
+            blocks.append(np.hstack([s[keep], column]))
+            totals.append(n[keep] + occupation)
+        s = np.vstack(blocks)
+        n = np.concatenate(totals)
+
+    order = np.lexsort([s[:, k] for k in range(s.shape[1])] + [n])
+    return s[order]
+
+
+def basis_index(states, targets):
+    """Finds the rows of a set of states within a basis.
+
+    The states are encoded as integers in a mixed radix given by the maximum
+    occupation of every mode, so that the lookup reduces to a binary search
+    over the sorted codes of the basis.
+
+    Parameters
+    ----------
+    states : array
+        States of the Hilbert space, one state per row.
+
+    targets : array
+        States to look for, one state per row.
+
+    Returns
+    -------
+    rows : array
+        Row of every target state in `states`, or -1 if the state does not
+        belong to the basis.
+    """
+    states = np.asarray(states, dtype=np.int64)
+    targets = np.atleast_2d(np.asarray(targets, dtype=np.int64))
+    radix = states.max(axis=0) + 1
+    weights = np.concatenate([[1], np.cumprod(radix[:-1])])
+
+    keys = states.dot(weights)
+    order = np.argsort(keys, kind='mergesort')
+    sorted_keys = keys[order]
+
+    valid = np.all((targets >= 0) & (targets < radix), axis=1)
+    target_keys = targets.dot(weights)
+    pos = np.minimum(np.searchsorted(sorted_keys, target_keys),
+                     len(sorted_keys) - 1)
+    found = valid & (sorted_keys[pos] == target_keys)
+    return np.where(found, order[pos], -1)
+
+
+def destroy_mode(states, mode):
+    """
+    Destruction (lowering) operator for the excitations of a single mode of
+    the basis.
+
+    The operator is assembled directly in sparse format: every state with at
+    least one excitation in `mode` is connected to the state with one less
+    excitation, found by a binary search over the mixed-radix codes of the
+    basis (see `basis_index`), so that time and memory scale with the number
+    of nonzero elements instead of with the square of the number of states.
+
+    Parameters
+    ----------
+    states : array
+        States of the Hilbert space, one state per row.
+
+    mode : int
+        Column of `states` holding the occupation of the mode. Two-level
+        emitters (occupations 0 and 1) and bosonic modes are treated alike.
+
+    Returns
+    -------
+    oper : qobj
+        Qobj for the destruction operator of the mode.
+    """
+    states = np.asarray(states)
+    nstates = len(states)
+
+    cols = np.nonzero(states[:, mode] > 0)[0]
+    targets = states[cols].copy()
+    targets[:, mode] -= 1
+    rows = basis_index(states, targets)
+    keep = rows >= 0
+    cols = cols[keep]
+
+    a = sp.coo_matrix((np.sqrt(states[cols, mode]).astype(complex),
+                       (rows[keep], cols)),
+                      shape=(nstates, nstates)).tocsr()
+    return Qobj(a, isherm=False)
+
+
+def excitation_number(states):
+    """
+    Operator for the total number of excitations, which is diagonal in the
+    basis.
+
+    Multiplied by a bare frequency it defines the rotating frame that removes
+    that frequency from Hamiltonians that conserve the number of excitations
+    (see :func:`quantum.rotating_frame`).
+
+    Parameters
+    ----------
+    states : array
+        States of the Hilbert space, one state per row.
+
+    Returns
+    -------
+    oper : qobj
+        Qobj for the total number of excitations.
+    """
+    n = np.asarray(states).sum(axis=1)
+    return Qobj(sp.diags(n.astype(complex), format='csr'), isherm=True)
@@ -66,23 +66,34 @@ This module provides solvers for the Lindblad master equation and von Neumann
 equation.
 """
 
-__all__ = ['mesolve', 'odesolve']
+__all__ = ['mesolve', 'mesolve_batch', 'mesolve_adaptive', 'odesolve']
 
 
 import os
 import types
+import cmath
 from functools import partial
 import numpy as np
 import scipy.sparse as sp
+import scipy.linalg as la
 import scipy.integrate
+from scipy.sparse.linalg import expm_multiply
+from scipy.special import erf
 import warnings
 import qutip.settings as qset
 from qutip.qobj import Qobj, isket, isoper, issuper
-from quantum.superoperator import mat2vec, vec2mat, spre, spost, liouvillian
-from qutip.expect import expect_rho_vec
+from quantum.superoperator import (spre, spost, liouvillian,
+                                   liouvillian_action, liouvillian_blocks,
+                                   LiouvillianTemplate, operator_to_vector,
+                                   hermitian_basis, real_liouvillian,
+                                   _merge_pattern)
+from quantum.trajectory import StateArray
+from quantum.frame import (rotating_frame, _frame_frequencies,
+                           _split_frequencies, _lab_state)
+from quantum.rhs_cache import cached_rhs
+from quantum.manifold import basis_index
 from qutip.solver import Options, Result, config, _solver_safety_check
 from qutip.cy.spmatfuncs import cy_ode_rhs, cy_ode_rho_func_td
-from qutip.cy.spconvert import dense2D_to_fastcsr_fmode
 from qutip.cy.codegen import Codegen
 from qutip.cy.utilities import _cython_build_cleanup
 from qutip.rhs_generate import rhs_generate
@@ -104,13 +115,42 @@ if qset.has_openmp:
 if debug:
     import inspect
 
+# largest Liouvillian dimension for which the propagator solver caches the
+# dense matrix exponential instead of using the action of the exponential
+_propagator_dense_dim = 1024
+
+# condition number of the eigenvector matrix above which the spectral solver
+# considers the Liouvillian defective and falls back on its Schur form
+_spectral_cond_max = 1e10
+
+# maximum number of elements of the eigenvalue-time array evaluated at once
+# by the spectral solver
+_spectral_chunk_size = 2 ** 22
+
+# methods of scipy.integrate.solve_ivp available as integrators, and those
+# among them that only support real states, which integrate the real and
+# imaginary parts of the state
+_ivp_methods = ['BDF', 'Radau', 'LSODA', 'RK45', 'RK23', 'DOP853']
+_ivp_real_methods = ['Radau', 'LSODA']
+
+# functions available to the string-format coefficients evaluated by the
+# 'numpy' backend, with the complex semantics of the generated cython code
+_td_namespace = {name: getattr(cmath, name) for name in
+                 ['acos', 'acosh', 'asin', 'asinh', 'atan', 'atanh', 'cos',
+                  'cosh', 'exp', 'log', 'log10', 'sin', 'sinh', 'sqrt',
+                  'tan', 'tanh']}
+_td_namespace.update(pi=np.pi, abs=abs, arg=cmath.phase, conj=np.conj,
+                     real=np.real, imag=np.imag, norm=lambda z: abs(z) ** 2,
+                     erf=erf, zerf=erf, np=np)
+
 
 # -----------------------------------------------------------------------------
 # pass on to wavefunction solver or master equation solver depending on whether
 # any collapse operators were given.
 #
 def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
-            progress_bar=None, _safe_mode=True):
+            progress_bar=None, _safe_mode=True, solver='ode', stream=False,
+            frame=None, blocks=None, real=False):
     """
     Master equation evolution of a density matrix for a given Hamiltonian and
     set of collapse operators, or a Liouvillian.
@@ -173,7 +213,24 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
     should be an instance of :class:`qutip.solver.Options`. Many ODE
     integration options can be set this way, and the `store_states` and
     `store_final_state` options can be used to store states even though
-    expectation values are requested via the `e_ops` argument.
+    expectation values are requested via the `e_ops` argument. The states are
+    stored in a :class:`quantum.StateArray`, backed by one contiguous
+    (T, N, N) array; if the options have a `states_file` attribute with a file
+    name, the array is memory-mapped to that file. The Cython code of
+    string-format time-dependent problems is compiled once and kept in a
+    persistent cache shared by all runs (see :func:`quantum.rhs_cache_dir`),
+    unless the options have a `rhs_filename` or a false `rhs_cache`
+    attribute. Setting the `rhs_backend` attribute of the options to 'numpy'
+    skips the compilation altogether: the coefficients are evaluated in
+    python and the right-hand side with a single sparse product, which is
+    faster for short runs. The `integrator` attribute of the options selects
+    the ODE integrator: 'zvode' (default), or one of the methods of
+    `scipy.integrate.solve_ivp` ('BDF', 'Radau', 'LSODA', 'RK45', 'RK23',
+    'DOP853'). For constant problems, BDF and Radau use the sparse
+    Liouvillian as the exact Jacobian, which allows large stable steps for
+    stiff problems, and for time-dependent terms given as functions or with
+    the numpy backend they use its sparsity pattern; Radau and LSODA
+    integrate the real and imaginary parts of the state.
 
     .. note::
 
@@ -200,7 +257,8 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
 
     H : :class:`qutip.Qobj`
         System Hamiltonian, or a callback function for time-dependent
-        Hamiltonians, or alternatively a system Liouvillian.
+        Hamiltonians, or alternatively a system Liouvillian or a
+        :class:`quantum.LiouvillianTemplate` at its current parameters.
 
     rho0 : :class:`qutip.Qobj`
         initial density matrix or state vector (ket).
@@ -227,6 +285,65 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
         Optional instance of BaseProgressBar, or a subclass thereof, for
         showing the progress of the simulation.
 
+    solver : str {'ode', 'matrix-free', 'propagator', 'spectral'}
+        Method used to evolve the density matrix. 'ode' (default) integrates
+        the vectorized master equation with the assembled Liouvillian.
+        'matrix-free' evaluates the right-hand side directly on the density
+        matrix with sparse-times-dense products, so that the Liouvillian is
+        never assembled. 'propagator' applies the exact propagator
+        exp(L dt) repeatedly over a uniformly spaced `tlist`, either as a
+        cached dense matrix for small systems or through the action of the
+        matrix exponential, so that the cost does not depend on the
+        stiffness of the problem. 'spectral' diagonalizes the dense
+        Liouvillian once and evaluates the expectation values for the whole
+        `tlist` as a single sum of exponentials; if the Liouvillian is
+        defective it falls back on the propagator built from its Schur form.
+        All but 'ode' require a constant Hamiltonian and collapse
+        operators.
+
+    stream : bool
+        If True, return a generator that yields the results as the integrator
+        advances instead of accumulating them in a :class:`qutip.Result`, so
+        that long runs can be reduced on the fly with constant memory. Each
+        item is a tuple `(t, expect_row)` with the array of expectation values
+        of `e_ops` at time `t`, or `(t, rho_vec)` with a copy of the
+        vectorized density matrix if `e_ops` is empty or a callback function
+        (which is still invoked). A ket `rho0` is converted to a density
+        matrix. Not supported by the 'spectral' solver.
+
+    frame : qobj
+        Hermitian operator R, diagonal in the basis of the Hilbert space, that
+        defines a rotating frame, e.g. the total number of excitations times
+        a bare frequency. The master equation is solved for
+        exp(iRt) rho exp(-iRt), which strips the frequencies of R from the
+        dynamics (see :func:`quantum.rotating_frame`), so that the
+        integrator only resolves the slow time scales. The expectation values
+        and the states are returned in the laboratory frame; the states are
+        transformed back lazily on indexing. Requires a constant or
+        list-format Hamiltonian and collapse operators that oscillate with a
+        single frequency in the rotating frame.
+
+    blocks : bool / qobj
+        Split the Liouvillian into the independent blocks of elements of the
+        density matrix that it couples (see
+        :func:`quantum.liouvillian_blocks`): True finds them from its sparsity
+        pattern, and a diagonal charge operator, such as the number of
+        excitations, groups the coherences by charge difference. Every block
+        is evolved with its own integrator and the blocks in which `rho0`
+        vanishes are skipped, e.g. all but the populations block for a
+        diagonal `rho0`. Requires the 'ode' solver, a constant Hamiltonian and
+        collapse operators, and no stream output.
+
+    real : bool
+        Evolve the N^2 real coordinates of the Hermitian density matrix (see
+        :func:`quantum.hermitian_basis`) with the real Liouvillian given by
+        :func:`quantum.real_liouvillian`, which halves the storage and
+        avoids complex arithmetic in the integrator (vode in place of zvode,
+        or the real solve_ivp methods). Only the Hermitian part of the
+        Hamiltonian is kept. Requires the 'ode' solver, a constant
+        Hamiltonian and collapse operators, and a state vector or a density
+        matrix as initial condition.
+
     Returns
     -------
 
@@ -237,9 +354,18 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
         specified by `tlist`, or an *array* `result.states` of state vectors or
         density matrices corresponding to the times in `tlist` [if `e_ops` is
         an empty list], or nothing if a callback function was given in place of
-        operators for which to calculate the expectation values.
+        operators for which to calculate the expectation values. A generator
+        if `stream` is True.
 
     """
+    # a template stands for its Liouvillian at the current parameters
+    if isinstance(H, LiouvillianTemplate):
+        H = H.liouvillian()
+
+    # blocks=False means the same as the default, no splitting
+    if not blocks:
+        blocks = None
+
     # check whether c_ops or e_ops is is a single operator
     # if so convert it to a list containing only that operator
     if isinstance(c_ops, Qobj):
@@ -254,6 +380,15 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
     else:
         e_ops_dict = None
 
+    if frame is not None:
+        res = _mesolve_rotating_frame(H, rho0, tlist, c_ops, e_ops, args,
+                                      options, progress_bar, _safe_mode,
+                                      solver, stream, frame, blocks, real)
+        if e_ops_dict and not stream:
+            res.expect = {e: res.expect[n]
+                          for n, e in enumerate(e_ops_dict.keys())}
+        return res
+
     if _safe_mode:
         _solver_safety_check(H, rho0, c_ops, e_ops, args)
 
@@ -262,6 +397,17 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
     elif progress_bar is True:
         progress_bar = TextProgressBar()
 
+    if solver not in ['ode', 'matrix-free', 'propagator', 'spectral']:
+        raise ValueError("Invalid solver argument for mesolve.")
+
+    if stream:
+        if solver == 'spectral':
+            raise ValueError("The spectral solver does not support stream " +
+                             "output.")
+        # the unitary solvers cannot stream: evolve a density matrix instead
+        if isket(rho0):
+            rho0 = ket2dm(rho0)
+
     # check if rho0 is a superoperator, in which case e_ops argument should
     # be empty, i.e., e_ops = []
     if issuper(rho0) and not e_ops == []:
@@ -307,25 +453,69 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
         # operator. Then delegate to appropriate solver...
         #
 
-        if isinstance(H, Qobj):
+        if solver != 'ode' and not (isinstance(H, Qobj) and
+                                    n_func == 0 and n_str == 0):
+            raise TypeError("The " + solver + " solver requires a " +
+                            "constant Hamiltonian and collapse operators.")
+
+        if blocks is not None and (solver != 'ode' or stream or
+                                   not (isinstance(H, Qobj) and
+                                        n_func == 0 and n_str == 0)):
+            raise TypeError("Solving by blocks requires the 'ode' solver, " +
+                            "a constant Hamiltonian and collapse operators " +
+                            "and no stream output.")
+
+        if real and (solver != 'ode' or blocks is not None or
+                     not (isinstance(H, Qobj) and
+                          n_func == 0 and n_str == 0)):
+            raise TypeError("The real representation requires the 'ode' " +
+                            "solver, a constant Hamiltonian and collapse " +
+                            "operators, and no blocks.")
+
+        if blocks is not None:
+            res = _mesolve_const_blocks(H, rho0, tlist, c_ops,
+                                        e_ops, args, options,
+                                        progress_bar, blocks)
+
+        elif real:
+            res = _mesolve_const_real(H, rho0, tlist, c_ops,
+                                      e_ops, args, options,
+                                      progress_bar, stream)
+
+        elif solver == 'matrix-free':
+            res = _mesolve_const_mf(H, rho0, tlist, c_ops,
+                                    e_ops, args, options,
+                                    progress_bar, stream)
+
+        elif solver == 'propagator':
+            res = _mesolve_const_propagator(H, rho0, tlist, c_ops,
+                                            e_ops, args, options,
+                                            progress_bar, stream)
+
+        elif solver == 'spectral':
+            res = _mesolve_const_spectral(H, rho0, tlist, c_ops,
+                                          e_ops, args, options,
+                                          progress_bar)
+
+        elif isinstance(H, Qobj):
             # constant hamiltonian
             if n_func == 0 and n_str == 0:
                 # constant collapse operators
                 res = _mesolve_const(H, rho0, tlist, c_ops,
                                      e_ops, args, options,
-                                     progress_bar)
+                                     progress_bar, stream)
             elif n_str > 0:
                 # constant hamiltonian but time-dependent collapse
                 # operators in list string format
                 res = _mesolve_list_str_td([H], rho0, tlist, c_ops,
                                            e_ops, args, options,
-                                           progress_bar)
+                                           progress_bar, stream)
             elif n_func > 0:
                 # constant hamiltonian but time-dependent collapse
                 # operators in list function format
                 res = _mesolve_list_func_td([H], rho0, tlist, c_ops,
                                             e_ops, args, options,
-                                            progress_bar)
+                                            progress_bar, stream)
 
         elif isinstance(H, (types.FunctionType,
                             types.BuiltinFunctionType, partial)):
@@ -338,7 +528,7 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
             else:
                 res = _mesolve_func_td(H, rho0, tlist, c_ops,
                                        e_ops, args, options,
-                                       progress_bar)
+                                       progress_bar, stream)
 
         elif isinstance(H, list):
             # determine if we are dealing with list of [Qobj, string] or
@@ -347,11 +537,11 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
             if n_func > 0:
                 res = _mesolve_list_func_td(H, rho0, tlist, c_ops,
                                             e_ops, args, options,
-                                            progress_bar)
+                                            progress_bar, stream)
             else:
                 res = _mesolve_list_str_td(H, rho0, tlist, c_ops,
                                            e_ops, args, options,
-                                           progress_bar)
+                                           progress_bar, stream)
 
         else:
             raise TypeError("Incorrect specification of Hamiltonian " +
@@ -375,18 +565,477 @@ def mesolve(H, rho0, tlist, c_ops=[], e_ops=[], args={}, options=None,
             res = _sesolve_const(H, rho0, tlist,
                                  e_ops, args, options, progress_bar)
 
-    if e_ops_dict:
+    if e_ops_dict and not stream:
         res.expect = {e: res.expect[n]
                       for n, e in enumerate(e_ops_dict.keys())}
 
     return res
 
 
+# -----------------------------------------------------------------------------
+# Master equation solver in a rotating frame
+#
+def _mesolve_rotating_frame(H, rho0, tlist, c_ops, e_ops, args, options,
+                            progress_bar, _safe_mode, solver, stream, frame,
+                            blocks, real):
+    """
+    Solve the master equation in the frame rotating with the diagonal
+    operator `frame` and transform the results back to the laboratory frame.
+    The expectation value of every operator is the sum of those of its parts
+    that oscillate with a single frequency in the rotating frame, each times
+    its phase.
+    """
+    if issuper(rho0):
+        raise TypeError("The rotating frame requires a state vector or " +
+                        "a density matrix as initial condition.")
+
+    H, c_ops, args = _td_wrap_array_str(H, c_ops, args, tlist)
+    H_rot, c_ops_rot = rotating_frame(H, c_ops, frame)
+    r = _frame_frequencies(frame)
+    times = np.asarray(tlist, dtype=float)
+    rho0_rot = _lab_state(rho0, -r, times[0])
+
+    if isinstance(e_ops, list):
+        parts = [_split_frequencies(op, r) for op in e_ops]
+        e_ops_rot = [part for op_parts in parts for _, part in op_parts]
+        freqs = np.array([w for op_parts in parts for w, _ in op_parts])
+        # sums the parts of every operator
+        owner = np.repeat(np.arange(len(e_ops)),
+                          [len(op_parts) for op_parts in parts])
+        M = sp.csr_matrix((np.ones(len(owner)),
+                           (owner, np.arange(len(owner)))),
+                          shape=(len(e_ops), len(owner)))
+        real_expect = [op.isherm and (rho0.isket or rho0.isherm)
+                       for op in e_ops]
+    else:
+        def e_ops_rot(t, rho):
+            e_ops(t, _lab_state(rho, r, t))
+
+    def lab_expect(expect, t):
+        expect = M.dot(expect * np.exp(1j * np.outer(freqs, t)))
+        return [np.real(row) if real_expect[m] else row
+                for m, row in enumerate(expect)]
+
+    res = mesolve(H_rot, rho0_rot, tlist, c_ops_rot, e_ops_rot, args,
+                  options, progress_bar, _safe_mode, solver, stream,
+                  blocks=blocks, real=real)
+
+    if stream:
+        def lab_stream():
+            for t, y in res:
+                if isinstance(e_ops, list) and len(e_ops) > 0:
+                    yield t, np.array(lab_expect(y[:, np.newaxis], [t]))[:, 0]
+                else:
+                    u = np.exp(-1j * r * t)
+                    yield t, (y.reshape(len(r), len(r)) *
+                              np.outer(u, u.conj())).ravel()
+        return lab_stream()
+
+    if isinstance(e_ops, list) and len(e_ops) > 0:
+        res.expect = lab_expect(np.array(res.expect).reshape(-1, len(times)),
+                                times)
+        res.num_expect = len(e_ops)
+
+    if isinstance(res.states, StateArray):
+        res.states.frame = (r, times)
+    elif len(res.states) > 0:
+        res.states = [_lab_state(state, r, t)
+                      for state, t in zip(res.states, times)]
+
+    if getattr(res, 'final_state', None) is not None:
+        res.final_state = _lab_state(res.final_state, r, times[-1])
+
+    return res
+
+
+# -----------------------------------------------------------------------------
+# Batched master equation solver
+#
+def mesolve_batch(H, rho0_list, tlist, c_ops=[], e_ops=[], args={},
+                  options=None, progress_bar=None):
+    """
+    Master equation evolution of a batch of initial states for a constant
+    Hamiltonian and collapse operators.
+
+    The K vectorized initial density matrices are stacked as the columns of a
+    single block that is advanced by one integrator, with the right-hand side
+    computed as one sparse-times-dense product of the Liouvillian with the
+    whole block. The Liouvillian is built once for the batch, which makes
+    this much faster than K separate calls to `mesolve`, e.g. to evolve every
+    basis state when building a process map.
+
+    Parameters
+    ----------
+    H : :class:`qutip.Qobj`
+        System Hamiltonian or Liouvillian, or a
+        :class:`quantum.LiouvillianTemplate` at its current parameters.
+
+    rho0_list : list of :class:`qutip.Qobj`
+        initial kets or density matrices, all with the same dimensions.
+
+    tlist : *list* / *array*
+        list of times for :math:`t`.
+
+    c_ops : list of :class:`qutip.Qobj`
+        single collapse operator, or list of collapse operators.
+
+    e_ops : list of :class:`qutip.Qobj`
+        single operator or list of operators for which to evaluate
+        expectation values.
+
+    args : *dictionary*
+        not used, kept for consistency with `mesolve`.
+
+    options : :class:`qutip.Options`
+        with options for the solver.
+
+    progress_bar: BaseProgressBar
+        Optional instance of BaseProgressBar, or a subclass thereof, for
+        showing the progress of the simulation.
+
+    Returns
+    -------
+
+    result: :class:`qutip.Result`
+
+        An instance of the class :class:`qutip.Result`, where each element of
+        `result.expect` is an *array* of shape (K, T) with the expectation
+        values of the corresponding operator for every initial state and
+        time, and `result.states` [if `e_ops` is an empty list or the
+        `store_states` option is set] is a list with the
+        :class:`quantum.StateArray` of each initial state, all of them views
+        of a single (K, T, N, N) array.
+
+    """
+    if isinstance(H, LiouvillianTemplate):
+        H = H.liouvillian()
+
+    if isinstance(c_ops, Qobj):
+        c_ops = [c_ops]
+
+    if isinstance(e_ops, Qobj):
+        e_ops = [e_ops]
+
+    if not isinstance(H, Qobj) or not all(isinstance(c, Qobj)
+                                          for c in c_ops):
+        raise TypeError("mesolve_batch requires a constant Hamiltonian " +
+                        "and collapse operators.")
+
+    if not isinstance(e_ops, list):
+        raise TypeError("Expectation parameter must be a list")
+
+    if progress_bar is None:
+        progress_bar = BaseProgressBar()
+    elif progress_bar is True:
+        progress_bar = TextProgressBar()
+
+    if options is None:
+        options = Options()
+    opt = options
+
+    rho0_list = [ket2dm(rho0) if isket(rho0) else rho0 for rho0 in rho0_list]
+    if len(rho0_list) == 0:
+        raise ValueError("rho0_list must contain at least one state.")
+    dims = rho0_list[0].dims
+    for rho0 in rho0_list:
+        if not isinstance(rho0, Qobj) or not isoper(rho0):
+            raise TypeError("The initial states must be kets or density " +
+                            "matrices.")
+        if rho0.dims != dims:
+            raise TypeError("All the initial states must have the same " +
+                            "dimensions.")
+
+    #
+    # construct liouvillian
+    #
+    if opt.tidy:
+        H = H.tidyup(opt.atol)
+
+    L = liouvillian(H, c_ops)
+
+    #
+    # setup integrator
+    #
+    n_batch = len(rho0_list)
+    n_tsteps = len(tlist)
+    initial_block = np.column_stack([_state2vec(rho0) for rho0 in rho0_list])
+
+    r = _ode_integrator(_ode_super_func, opt,
+                        sp.kron(sp.identity(n_batch), L.data))
+    r.set_f_params(L.data)
+    r.set_initial_value(initial_block.ravel('F'), tlist[0])
+
+    #
+    # prepare output array
+    #
+    output = Result()
+    output.solver = "mesolve_batch"
+    output.times = tlist
+
+    n_expt_op = len(e_ops)
+    if n_expt_op == 0:
+        # fall back on storing states
+        opt.store_states = True
+    else:
+        e_rows = _expect_rows(e_ops)
+        expect = np.zeros((n_expt_op, n_batch, n_tsteps), dtype=complex)
+
+    if opt.store_states:
+        n = rho0_list[0].shape[0]
+        states = np.zeros((n_batch, n_tsteps, n, n), dtype=complex)
+
+    #
+    # start evolution
+    #
+    for t_idx, t in _ode_steps(r, tlist, progress_bar):
+        y = r.y.reshape((-1, n_batch), order='F')
+
+        if opt.store_states:
+            states[:, t_idx] = y.T.reshape((n_batch, n, n))
+
+        if n_expt_op > 0:
+            expect[:, :, t_idx] = e_rows * y
+
+    if n_expt_op > 0:
+        output.expect = []
+        output.num_expect = n_expt_op
+        herm = all(rho0.isherm for rho0 in rho0_list)
+        for m in range(n_expt_op):
+            if e_ops[m].isherm and herm:
+                output.expect.append(np.real(expect[m]))
+            else:
+                output.expect.append(expect[m])
+
+    if opt.store_states:
+        output.states = [StateArray.from_array(states[k], dims)
+                         for k in range(n_batch)]
+
+    if opt.store_final_state:
+        y = r.y.reshape((-1, n_batch), order='F')
+        output.final_state = [Qobj(_vec2state(y[:, k], rho0_list[k]),
+                                   dims=dims, isherm=True)
+                              for k in range(n_batch)]
+
+    return output
+
+
+def mesolve_adaptive(system, rho0, tlist, N, e_ops=None, options=None,
+                     progress_bar=None, grow_tol=1e-4, shrink_tol=None,
+                     N_min=1, N_max=50):
+    """
+    Master equation evolution in a basis truncated by excitation manifold
+    that grows and shrinks with the population of its highest manifolds.
+
+    The populations of the manifolds are checked at every time in `tlist`.
+    If the population of the highest manifold exceeds `grow_tol`, the step
+    from the previous time is repeated with the state embedded in the basis
+    of the next manifold, until it stays below. If the population of the
+    manifold below the highest one drops below `shrink_tol`, the state is
+    projected onto the basis of that manifold. The Liouvillian of every
+    manifold is built once, the first time it is needed.
+
+    Parameters
+    ----------
+    system : callable
+        Function of the maximum excitation manifold N returning the basis,
+        Hamiltonian and list of collapse operators, ``(states, H, c_ops)``,
+        e.g. built on `quantum.atom_cavity.states(N)`. The basis of each
+        manifold must contain that of the manifold below.
+
+    rho0 : :class:`qutip.Qobj`
+        initial ket or density matrix in the basis of manifold `N`.
+
+    tlist : *list* / *array*
+        list of times for :math:`t`.
+
+    N : int
+        Initial maximum excitation manifold.
+
+    e_ops : callable
+        Function of the basis returning the list of operators for which to
+        evaluate expectation values, or None to store the states.
+
+    options : :class:`qutip.Options`
+        with options for the solver.
+
+    progress_bar: BaseProgressBar
+        Optional instance of BaseProgressBar, or a subclass thereof, for
+        showing the progress of the simulation.
+
+    grow_tol : float, default = 1e-4
+        Population of the highest manifold above which the basis grows.
+
+    shrink_tol : float, default = grow_tol / 100
+        Population of the manifold below the highest one under which the
+        basis shrinks.
+
+    N_min, N_max : int
+        Bounds of the maximum excitation manifold.
+
+    Returns
+    -------
+
+    result: :class:`qutip.Result`
+
+        An instance of the class :class:`qutip.Result`, with the expectation
+        values in `result.expect`, or the density matrices, each in the
+        basis of its time, in `result.states`. The maximum excitation
+        manifold at every time is stored in `result.N`, and
+        `result.truncated` is True at the times where the population of the
+        highest manifold exceeds `grow_tol` at `N_max`, which also raises a
+        warning.
+
+    """
+    if shrink_tol is None:
+        shrink_tol = grow_tol / 100
+
+    if progress_bar is None:
+        progress_bar = BaseProgressBar()
+    elif progress_bar is True:
+        progress_bar = TextProgressBar()
+
+    if options is None:
+        options = Options()
+    opt = options
+
+    # basis, liouvillian, expectation rows and excitations of every manifold
+    levels = {}
+
+    def level(N):
+        if N not in levels:
+            states, H, c_ops = system(N)
+            states = np.asarray(states)
+            if opt.tidy:
+                H = H.tidyup(opt.atol)
+            L = liouvillian(H, c_ops)
+            e_rows = None if e_ops is None else _expect_rows(e_ops(states))
+            levels[N] = (states, L.data, e_rows, states.sum(axis=1))
+        return levels[N]
+
+    def integrator(N, y, t):
+        L = level(N)[1]
+        r = _ode_integrator(cy_ode_rhs, opt, L)
+        r.set_f_params(L.data, L.indices, L.indptr)
+        r.set_initial_value(y, t)
+        return r
+
+    def populations(N, y):
+        states, _, _, excitations = level(N)
+        diag = np.real(y[::len(states) + 1])
+        return np.bincount(excitations, weights=diag, minlength=N + 1)
+
+    if isket(rho0):
+        rho0 = ket2dm(rho0)
+    if len(level(N)[0]) != rho0.shape[0]:
+        raise ValueError("rho0 must be in the basis of manifold N.")
+    herm = rho0.isherm
+
+    #
+    # prepare output array
+    #
+    n_tsteps = len(tlist)
+    output = Result()
+    output.solver = "mesolve_adaptive"
+    output.times = tlist
+    output.N = np.zeros(n_tsteps, dtype=int)
+    output.truncated = np.zeros(n_tsteps, dtype=bool)
+    top_max = 0.0
+    if e_ops is None:
+        opt.store_states = True
+        n_expt_op = 0
+    else:
+        n_expt_op = level(N)[2].shape[0]
+        expect = np.zeros((n_expt_op, n_tsteps), dtype=complex)
+        real = [op.isherm and herm for op in e_ops(level(N)[0])]
+    if opt.store_states:
+        output.states = []
+
+    #
+    # start evolution
+    #
+    y = _state2vec(rho0)
+    r = integrator(N, y, tlist[0])
+    progress_bar.start(n_tsteps)
+    for t_idx, t in enumerate(tlist):
+        progress_bar.update(t_idx)
+
+        if t_idx > 0:
+            t_prev, y_prev = r.t, y
+            y = r.integrate(t)
+            while (r.successful() and N < N_max and
+                   populations(N, y)[N] > grow_tol):
+                # repeat the step in the basis of the next manifold
+                y_prev = _resize_state(y_prev, level(N)[0], level(N + 1)[0])
+                N += 1
+                r = integrator(N, y_prev, t_prev)
+                y = r.integrate(t)
+            if not r.successful():
+                raise Exception("ODE integration error: Try to increase "
+                                "the allowed number of substeps by increasing "
+                                "the nsteps parameter in the Options class.")
+            top = populations(N, y)[N]
+            if top > grow_tol:
+                # the basis cannot grow beyond N_max
+                output.truncated[t_idx] = True
+                top_max = max(top_max, top)
+            while N > N_min and populations(N, y)[N - 1] < shrink_tol:
+                y = _resize_state(y, level(N)[0], level(N - 1)[0])
+                N -= 1
+                r = integrator(N, y, t)
+
+        output.N[t_idx] = N
+        if opt.store_states:
+            n = len(level(N)[0])
+            output.states.append(Qobj(y.reshape((n, n)), isherm=True))
+        if n_expt_op > 0:
+            expect[:, t_idx] = level(N)[2] * y
+
+    progress_bar.finished()
+
+    if output.truncated.any():
+        warnings.warn('The population of the highest manifold reached ' +
+                      str(top_max) + ' at N_max.', UserWarning)
+
+    if n_expt_op > 0:
+        output.expect = []
+        output.num_expect = n_expt_op
+        for m in range(n_expt_op):
+            if real[m]:
+                output.expect.append(np.real(expect[m]))
+            else:
+                output.expect.append(expect[m])
+
+    if opt.store_final_state:
+        n = len(level(N)[0])
+        output.final_state = Qobj(y.reshape((n, n)), isherm=True)
+
+    return output
+
+
+def _resize_state(y, states_from, states_to):
+    """
+    Embed the row-stacked density matrix y into a larger basis, or project
+    it onto a smaller one and restore its trace.
+    """
+    n_from = len(states_from)
+    n_to = len(states_to)
+    rho = y.reshape((n_from, n_from))
+    if n_to > n_from:
+        rows = basis_index(states_to, states_from)
+        out = np.zeros((n_to, n_to), dtype=complex)
+        out[np.ix_(rows, rows)] = rho
+    else:
+        rows = basis_index(states_from, states_to)
+        out = rho[np.ix_(rows, rows)]
+        out = out / np.trace(out)
+    return out.ravel()
+
+
 # -----------------------------------------------------------------------------
 # A time-dependent dissipative master equation on the list-function format
 #
 def _mesolve_list_func_td(H_list, rho0, tlist, c_list, e_ops, args, opt,
-                          progress_bar):
+                          progress_bar, stream=False):
     """
     Internal function for solving the master equation. See mesolve for usage.
     """
@@ -466,64 +1115,68 @@ def _mesolve_list_func_td(H_list, rho0, tlist, c_list, e_ops, args, opt,
     #
     # setup integrator
     #
-    initial_vector = mat2vec(rho0.full()).ravel('F')
+    initial_vector = _state2vec(rho0)
+    L_td = _TdLiouvillian([spec[0] for spec in L_list],
+                          [spec[1] for spec in L_list],
+                          [spec[2] for spec in L_list])
+    # the coefficients that depend on the state change the pattern of the
+    # Jacobian, which is only given for the linear equations
     if issuper(rho0):
         if opt.rhs_with_state:
-            r = scipy.integrate.ode(dsuper_list_td_with_state)
+            r = _ode_integrator(dsuper_list_td_with_state, opt)
         else:
-            r = scipy.integrate.ode(dsuper_list_td)
+            pattern = sp.kron(sp.identity(rho0.shape[1]), L_td.L)
+            r = _ode_integrator(dsuper_list_td, opt, jac_sparsity=pattern)
     else:
         if opt.rhs_with_state:
-            r = scipy.integrate.ode(drho_list_td_with_state)
+            r = _ode_integrator(drho_list_td_with_state, opt)
         else:
-            r = scipy.integrate.ode(drho_list_td)
-    r.set_integrator('zvode', method=opt.method, order=opt.order,
-                     atol=opt.atol, rtol=opt.rtol, nsteps=opt.nsteps,
-                     first_step=opt.first_step, min_step=opt.min_step,
-                     max_step=opt.max_step)
+            r = _ode_integrator(drho_list_td, opt, jac_sparsity=L_td.L)
     r.set_initial_value(initial_vector, tlist[0])
-    r.set_f_params(L_list, args)
+    r.set_f_params(L_td, args)
 
     #
     # call generic ODE code
     #
-    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar)
+    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                              stream)
+
+
+class _TdLiouvillian(object):
+    """
+    Sum of sparse superoperators with time-dependent coefficients. The terms
+    are merged onto a shared sparsity pattern once, so that evaluating the
+    sum at a given time only rescales the data into the preallocated data
+    array of a single CSR matrix, instead of allocating a new one.
+    """
+
+    def __init__(self, mats, funcs, squares=None):
+        self.L, self.data = _merge_pattern(mats)
+        self.funcs = funcs
+        if squares is None:
+            squares = [False] * len(mats)
+        self.squares = np.array(squares, dtype=bool)
+
+    def __call__(self, coeffs):
+        coeffs = np.array(coeffs, dtype=complex)
+        coeffs[self.squares] **= 2
+        np.dot(coeffs, self.data, out=self.L.data)
+        return self.L
 
 
 #
 # evaluate drho(t)/dt according to the master equation using the
-# [Qobj, function] style time dependence API
+# [Qobj, function] style time dependence API, where L_list is the
+# _TdLiouvillian of the [Qobj, function] terms
 #
 def drho_list_td(t, rho, L_list, args):
 
-    L = L_list[0][0] * L_list[0][1](t, args)
-    for n in range(1, len(L_list)):
-        #
-        # L_args[n][0] = the sparse data for a Qobj in super-operator form
-        # L_args[n][1] = function callback giving the coefficient
-        #
-        if L_list[n][2]:
-            L = L + L_list[n][0] * (L_list[n][1](t, args)) ** 2
-        else:
-            L = L + L_list[n][0] * L_list[n][1](t, args)
-
-    return L * rho
+    return L_list([f(t, args) for f in L_list.funcs]) * rho
 
 
 def drho_list_td_with_state(t, rho, L_list, args):
 
-    L = L_list[0][0] * L_list[0][1](t, rho, args)
-    for n in range(1, len(L_list)):
-        #
-        # L_args[n][0] = the sparse data for a Qobj in super-operator form
-        # L_args[n][1] = function callback giving the coefficient
-        #
-        if L_list[n][2]:
-            L = L + L_list[n][0] * (L_list[n][1](t, rho, args)) ** 2
-        else:
-            L = L + L_list[n][0] * L_list[n][1](t, rho, args)
-
-    return L * rho
+    return L_list([f(t, rho, args) for f in L_list.funcs]) * rho
 
 #
 # evaluate dE(t)/dt according to the master equation using the
@@ -531,40 +1184,19 @@ def drho_list_td_with_state(t, rho, L_list, args):
 #
 def dsuper_list_td(t, y, L_list, args):
 
-    L = L_list[0][0] * L_list[0][1](t, args)
-    for n in range(1, len(L_list)):
-        #
-        # L_args[n][0] = the sparse data for a Qobj in super-operator form
-        # L_args[n][1] = function callback giving the coefficient
-        #
-        if L_list[n][2]:
-            L = L + L_list[n][0] * (L_list[n][1](t, args)) ** 2
-        else:
-            L = L + L_list[n][0] * L_list[n][1](t, args)
-
-    return _ode_super_func(t, y, L)
+    return _ode_super_func(t, y, L_list([f(t, args) for f in L_list.funcs]))
 
 def dsuper_list_td_with_state(t, y, L_list, args):
 
-    L = L_list[0][0] * L_list[0][1](t, y, args)
-    for n in range(1, len(L_list)):
-        #
-        # L_args[n][0] = the sparse data for a Qobj in super-operator form
-        # L_args[n][1] = function callback giving the coefficient
-        #
-        if L_list[n][2]:
-            L = L + L_list[n][0] * (L_list[n][1](t, y, args)) ** 2
-        else:
-            L = L + L_list[n][0] * L_list[n][1](t, y, args)
-
-    return _ode_super_func(t, y, L)
+    return _ode_super_func(t, y,
+                           L_list([f(t, y, args) for f in L_list.funcs]))
 
 # -----------------------------------------------------------------------------
 # A time-dependent dissipative master equation on the list-string format for
 # cython compilation
 #
 def _mesolve_list_str_td(H_list, rho0, tlist, c_list, e_ops, args, opt,
-                         progress_bar):
+                         progress_bar, stream=False):
     """
     Internal function for solving the master equation. See mesolve for usage.
     """
@@ -572,6 +1204,10 @@ def _mesolve_list_str_td(H_list, rho0, tlist, c_list, e_ops, args, opt,
     if debug:
         print(inspect.stack()[0][3])
 
+    rhs_backend = getattr(opt, 'rhs_backend', 'cython')
+    if rhs_backend not in ['cython', 'numpy']:
+        raise ValueError("Invalid rhs_backend option: " + str(rhs_backend))
+
     #
     # check initial state: must be a density matrix
     #
@@ -682,6 +1318,29 @@ def _mesolve_list_str_td(H_list, rho0, tlist, c_list, e_ops, args, opt,
     # collapse operators)
     n_L_terms = len(Ldata)
 
+    if rhs_backend == 'numpy' or issuper(rho0):
+        #
+        # evaluate the coefficients in python and the right-hand side with
+        # the terms merged into one sparse matrix: no cython code to compile.
+        # Superoperators always take this path, which evolves all their
+        # columns with one sparse-times-dense product instead of one call of
+        # the compiled right-hand side per column
+        #
+        n = len(Lptrs[0]) - 1
+        L_td = _TdLiouvillian([sp.csr_matrix((Ldata[k], Linds[k], Lptrs[k]),
+                                             shape=(n, n))
+                               for k in range(n_L_terms)],
+                              _td_coeff_funcs(Lcoeff, args))
+        if issuper(rho0):
+            pattern = sp.kron(sp.identity(rho0.shape[1]), L_td.L)
+        else:
+            pattern = L_td.L
+        r = _ode_integrator(_ode_str_td_func, opt, jac_sparsity=pattern)
+        r.set_f_params(L_td)
+        r.set_initial_value(_state2vec(rho0), tlist[0])
+        return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                                  stream)
+
     # Check which components should use OPENMP
     omp_components = None
     if qset.has_openmp:
@@ -709,37 +1368,34 @@ def _mesolve_list_str_td(H_list, rho0, tlist, c_list, e_ops, args, opt,
     # generate and compile new cython code if necessary
     #
     if not opt.rhs_reuse or config.tdfunc is None:
-        if opt.rhs_filename is None:
-            config.tdname = "rhs" + str(os.getpid()) + str(config.cgen_num)
-        else:
-            config.tdname = opt.rhs_filename
         cgen = Codegen(h_terms=n_L_terms, h_tdterms=Lcoeff, args=args,
                        config=config, use_openmp=opt.use_openmp,
                        omp_components=omp_components,
                        omp_threads=opt.openmp_threads)
-        cgen.generate(config.tdname + ".pyx")
+        if opt.rhs_filename is None and getattr(opt, 'rhs_cache', True):
+            # compiled once and shared by all runs with the same code
+            config.tdname = None
+            config.tdfunc = cached_rhs(cgen)
+        else:
+            if opt.rhs_filename is None:
+                config.tdname = ("rhs" + str(os.getpid()) +
+                                 str(config.cgen_num))
+            else:
+                config.tdname = opt.rhs_filename
+            cgen.generate(config.tdname + ".pyx")
 
-        code = compile('from ' + config.tdname + ' import cy_td_ode_rhs',
-                       '<string>', 'exec')
-        exec(code, globals())
-        config.tdfunc = cy_td_ode_rhs
+            code = compile('from ' + config.tdname + ' import cy_td_ode_rhs',
+                           '<string>', 'exec')
+            exec(code, globals())
+            config.tdfunc = cy_td_ode_rhs
 
     #
     # setup integrator
     #
-    initial_vector = mat2vec(rho0.full()).ravel('F')
-    if issuper(rho0):
-        r = scipy.integrate.ode(_td_ode_rhs_super)
-        code = compile('r.set_f_params([' + parameter_string + '])',
-                       '<string>', 'exec')
-    else:
-        r = scipy.integrate.ode(config.tdfunc)
-        code = compile('r.set_f_params(' + parameter_string + ')',
-                       '<string>', 'exec')
-    r.set_integrator('zvode', method=opt.method, order=opt.order,
-                     atol=opt.atol, rtol=opt.rtol, nsteps=opt.nsteps,
-                     first_step=opt.first_step, min_step=opt.min_step,
-                     max_step=opt.max_step)
+    initial_vector = _state2vec(rho0)
+    r = _ode_integrator(config.tdfunc, opt)
+    code = compile('r.set_f_params(' + parameter_string + ')',
+                   '<string>', 'exec')
     r.set_initial_value(initial_vector, tlist[0])
 
     exec(code, locals(), args)
@@ -747,22 +1403,37 @@ def _mesolve_list_str_td(H_list, rho0, tlist, c_list, e_ops, args, opt,
     #
     # call generic ODE code
     #
-    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar)
+    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                              stream)
+
+def _td_coeff_funcs(coeffs, args):
+    """
+    Convert the string-format coefficients into python functions of time,
+    compiled once with the arguments and the functions of _td_namespace.
+    Cubic_Spline coefficients are callable and are used as they are.
+    """
+    namespace = dict(_td_namespace)
+    namespace.update(args)
+    funcs = []
+    for coeff in coeffs:
+        if isinstance(coeff, Cubic_Spline):
+            funcs.append(coeff)
+        else:
+            funcs.append(eval('lambda t: (' + coeff + ')', namespace))
+    return funcs
+
+
+def _ode_str_td_func(t, y, L_td):
+    # y is a density matrix or the columns of a superoperator, evolved with
+    # one sparse-times-dense product
+    return _ode_super_func(t, y, L_td([f(t) for f in L_td.funcs]))
 
-def _td_ode_rhs_super(t, y, arglist):
-    N = int(np.sqrt(len(y)))
-    out = np.zeros(N, dtype=complex)
-    y2 = np.zeros(len(y), dtype=complex)
-    for i in range(N):
-        out = cy_td_ode_rhs(t, y[i*N:(i+1)*N], *arglist)
-        y2[i*N:(i+1)*N] = out
-    return y2
 
 # -----------------------------------------------------------------------------
 # Master equation solver
 #
 def _mesolve_const(H, rho0, tlist, c_op_list, e_ops, args, opt,
-                   progress_bar):
+                   progress_bar, stream=False):
     """
     Evolve the density matrix using an ODE solver, for constant hamiltonian
     and collapse operators.
@@ -796,37 +1467,480 @@ def _mesolve_const(H, rho0, tlist, c_op_list, e_ops, args, opt,
     #
     # setup integrator
     #
-    initial_vector = mat2vec(rho0.full()).ravel('F')
+    initial_vector = _state2vec(rho0)
     if issuper(rho0):
-        r = scipy.integrate.ode(_ode_super_func)
+        r = _ode_integrator(_ode_super_func, opt,
+                            sp.kron(sp.identity(rho0.shape[1]), L.data))
         r.set_f_params(L.data)
     else:
         if opt.use_openmp and L.data.nnz >= qset.openmp_thresh:
-            r = scipy.integrate.ode(cy_ode_rhs_openmp)
+            r = _ode_integrator(cy_ode_rhs_openmp, opt, L.data)
             r.set_f_params(L.data.data, L.data.indices, L.data.indptr,
                             opt.openmp_threads)
         else:
-            r = scipy.integrate.ode(cy_ode_rhs)
+            r = _ode_integrator(cy_ode_rhs, opt, L.data)
             r.set_f_params(L.data.data, L.data.indices, L.data.indptr)
         # r = scipy.integrate.ode(_ode_rho_test)
         # r.set_f_params(L.data)
-    r.set_integrator('zvode', method=opt.method, order=opt.order,
-                     atol=opt.atol, rtol=opt.rtol, nsteps=opt.nsteps,
-                     first_step=opt.first_step, min_step=opt.min_step,
-                     max_step=opt.max_step)
     r.set_initial_value(initial_vector, tlist[0])
 
     #
     # call generic ODE code
     #
-    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar)
+    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                              stream)
 
 
+# -----------------------------------------------------------------------------
+# Master equation solver by blocks of the Liouvillian
 #
-# evaluate drho(t)/dt according to the master eqaution
-# [no longer used, replaced by cython function]
-#
-def _ode_rho_func(t, rho, L):
+def _mesolve_const_blocks(H, rho0, tlist, c_op_list, e_ops, args, opt,
+                          progress_bar, charge):
+    """
+    Evolve the density matrix using an ODE solver, for constant hamiltonian
+    and collapse operators, integrating the independent blocks of the
+    Liouvillian one after the other and skipping those in which the initial
+    density matrix vanishes.
+    """
+
+    if debug:
+        print(inspect.stack()[0][3])
+
+    #
+    # check initial state
+    #
+    if issuper(rho0):
+        raise TypeError("Solving by blocks requires a state vector or a " +
+                        "density matrix as initial condition.")
+    if isket(rho0):
+        rho0 = ket2dm(rho0)
+
+    if not isinstance(e_ops, (types.FunctionType, list)):
+        raise TypeError("Expectation parameter must be a list or a function")
+
+    #
+    # construct liouvillian and its blocks
+    #
+    if opt.tidy:
+        H = H.tidyup(opt.atol)
+
+    L = liouvillian(H, c_op_list)
+    _, indices, blocks = liouvillian_blocks(
+        L, None if charge is True else charge)
+
+    #
+    # prepare output array
+    #
+    n_tsteps = len(tlist)
+    initial_vector = _state2vec(rho0)
+    final_vector = np.zeros_like(initial_vector)
+
+    output = Result()
+    output.solver = "mesolve"
+    output.times = tlist
+
+    expt_callback = isinstance(e_ops, types.FunctionType)
+    n_expt_op = 0 if expt_callback else len(e_ops)
+    if n_expt_op == 0 and not expt_callback:
+        # fall back on storing states
+        opt.store_states = True
+    if n_expt_op > 0:
+        e_rows = _expect_rows(e_ops).tocsc()
+        expect = np.zeros((n_expt_op, n_tsteps), dtype=complex)
+
+    # the callback needs the full density matrix at every time, so that the
+    # states are kept until all blocks are done
+    if opt.store_states or expt_callback:
+        states = StateArray(n_tsteps, rho0.dims,
+                            getattr(opt, 'states_file', None))
+        vectors = states.array.reshape((n_tsteps, -1))
+
+    #
+    # evolve every block in which rho0 does not vanish, with one progress
+    # bar over all of them
+    #
+    active = [(idx, L_block) for idx, L_block in zip(indices, blocks)
+              if np.any(initial_vector[idx])]
+    progress_bar.start(len(active) * n_tsteps)
+    for k, (idx, L_block) in enumerate(active):
+        r = _ode_integrator(cy_ode_rhs, opt, L_block)
+        r.set_f_params(L_block.data, L_block.indices, L_block.indptr)
+        r.set_initial_value(initial_vector[idx], tlist[0])
+        if n_expt_op > 0:
+            e_block = e_rows[:, idx]
+
+        for t_idx, t in _ode_steps(r, tlist, BaseProgressBar()):
+            progress_bar.update(k * n_tsteps + t_idx)
+            if opt.store_states or expt_callback:
+                vectors[t_idx, idx] = r.y
+            if n_expt_op > 0:
+                expect[:, t_idx] += e_block * r.y
+
+        final_vector[idx] = r.y
+    progress_bar.finished()
+
+    if expt_callback:
+        for t_idx, t in enumerate(tlist):
+            e_ops(t, states[t_idx])
+
+    if opt.store_states:
+        output.states = states
+
+    if n_expt_op > 0:
+        output.expect = []
+        output.num_expect = n_expt_op
+        for m in range(n_expt_op):
+            if e_ops[m].isherm and rho0.isherm:
+                output.expect.append(np.real(expect[m]))
+            else:
+                output.expect.append(expect[m])
+
+    if opt.store_final_state:
+        output.final_state = Qobj(_vec2state(final_vector, rho0),
+                                  dims=rho0.dims, isherm=True)
+
+    return output
+
+
+# -----------------------------------------------------------------------------
+# Master equation solver in the real coordinates of the density matrix
+#
+def _mesolve_const_real(H, rho0, tlist, c_op_list, e_ops, args, opt,
+                        progress_bar, stream=False):
+    """
+    Evolve the density matrix using an ODE solver, for constant hamiltonian
+    and collapse operators, in the real coordinates of the Hermitian density
+    matrix with the real Liouvillian.
+    """
+
+    if debug:
+        print(inspect.stack()[0][3])
+
+    #
+    # check initial state
+    #
+    if isket(rho0):
+        rho0 = ket2dm(rho0)
+
+    if issuper(rho0):
+        raise TypeError("The real representation does not support " +
+                        "superoperator initial states.")
+
+    #
+    # construct the real liouvillian
+    #
+    if opt.tidy:
+        H = H.tidyup(opt.atol)
+
+    L_real = real_liouvillian(liouvillian(H, c_op_list))
+    B = hermitian_basis(rho0.shape[0])
+
+    #
+    # setup integrator, which exposes the vectorized density matrix
+    #
+    rho = rho0.full()
+    rho = 0.5 * (rho + rho.conj().T)
+    initial_vector = (B.conj().T * rho.ravel()).real
+    initial_vector[rho0.shape[0]:] *= 0.5
+    r = _ode_integrator(_ode_rho_func, opt, L_real, real=True)
+    r.set_f_params(L_real)
+    r.set_initial_value(initial_vector, tlist[0])
+
+    #
+    # call generic ODE code
+    #
+    return _generic_ode_solve(_HermitianIntegrator(r, B), rho0, tlist, e_ops,
+                              opt, progress_bar, stream)
+
+
+class _HermitianIntegrator(object):
+    """
+    Wrapper of an integrator of the real coordinates of the density matrix
+    that exposes the row-stacked density matrix as its state, for the generic
+    ODE code.
+    """
+
+    def __init__(self, r, B):
+        self.r = r
+        self.B = B
+        self.y = B * r.y
+
+    @property
+    def t(self):
+        return self.r.t
+
+    def successful(self):
+        return self.r.successful()
+
+    def integrate(self, t):
+        # the density matrix is built once per step, however often it is read
+        self.y = self.B * self.r.integrate(t)
+        return self.y
+
+
+# -----------------------------------------------------------------------------
+# Matrix-free master equation solver
+#
+def _mesolve_const_mf(H, rho0, tlist, c_op_list, e_ops, args, opt,
+                      progress_bar, stream=False):
+    """
+    Evolve the density matrix using an ODE solver, for constant hamiltonian
+    and collapse operators, without assembling the Liouvillian.
+    """
+
+    if debug:
+        print(inspect.stack()[0][3])
+
+    #
+    # check initial state
+    #
+    if isket(rho0):
+        rho0 = ket2dm(rho0)
+
+    if issuper(rho0):
+        raise TypeError("The matrix-free solver does not support " +
+                        "superoperator initial states.")
+
+    #
+    # construct the action of the liouvillian
+    #
+    if opt.tidy:
+        H = H.tidyup(opt.atol)
+
+    L_action = liouvillian_action(H, c_op_list)
+
+    #
+    # setup integrator
+    #
+    initial_vector = _state2vec(rho0)
+    r = _ode_integrator(_ode_rho_mf, opt)
+    r.set_f_params(L_action)
+    r.set_initial_value(initial_vector, tlist[0])
+
+    #
+    # call generic ODE code
+    #
+    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                              stream)
+
+
+#
+# evaluate drho(t)/dt as the action of the liouvillian on the density matrix
+#
+def _ode_rho_mf(t, rho, L_action):
+    return L_action(rho)
+
+
+# -----------------------------------------------------------------------------
+# Master equation solver by repeated application of the exact propagator
+#
+def _mesolve_const_propagator(H, rho0, tlist, c_op_list, e_ops, args, opt,
+                              progress_bar, stream=False):
+    """
+    Evolve the density matrix with the propagator exp(L dt), for constant
+    hamiltonian and collapse operators and a uniformly spaced tlist.
+    """
+
+    if debug:
+        print(inspect.stack()[0][3])
+
+    #
+    # check initial state
+    #
+    if isket(rho0):
+        rho0 = ket2dm(rho0)
+
+    dt = _uniform_time_step(tlist)
+
+    #
+    # construct liouvillian and propagator
+    #
+    if opt.tidy:
+        H = H.tidyup(opt.atol)
+
+    L = liouvillian(H, c_op_list)
+
+    if L.shape[0] <= _propagator_dense_dim:
+        U = la.expm(dt * L.full())
+
+        def step(y):
+            return U.dot(y)
+    else:
+        A = (dt * L.data).tocsc()
+
+        def step(y):
+            return expm_multiply(A, y)
+
+    #
+    # setup stepper
+    #
+    initial_vector = _state2vec(rho0)
+    r = _PropagatorStepper(step, dt, L.shape[0], initial_vector, tlist[0])
+
+    #
+    # call generic ODE code
+    #
+    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                              stream)
+
+
+def _uniform_time_step(tlist):
+    """
+    Time step of a uniformly spaced tlist.
+    """
+    if len(tlist) < 2:
+        return 0.0
+    dt = tlist[1] - tlist[0]
+    if not np.allclose(np.diff(tlist), dt):
+        raise ValueError("The propagator solver requires a uniformly " +
+                         "spaced tlist.")
+    return dt
+
+
+class _PropagatorStepper(object):
+    """
+    Replacement for the scipy.integrate.ode object used by _generic_ode_solve,
+    which advances the vectorized state by repeated application of a
+    propagator over a fixed time step. Superoperator states are propagated
+    column by column in a single product.
+    """
+
+    def __init__(self, step, dt, n, y0, t0):
+        self._step = step
+        self.dt = dt
+        self.n = n
+        self.y = y0
+        self.t = t0
+
+    def successful(self):
+        return True
+
+    def integrate(self, t):
+        nsteps = int(round((t - self.t) / self.dt))
+        Y = self.y.reshape((self.n, -1), order='F')
+        for _ in range(nsteps):
+            Y = self._step(Y)
+        self.y = Y.ravel('F')
+        self.t = t
+        return self.y
+
+# -----------------------------------------------------------------------------
+# Master equation solver by spectral decomposition of the Liouvillian
+#
+def _mesolve_const_spectral(H, rho0, tlist, c_op_list, e_ops, args, opt,
+                            progress_bar):
+    """
+    Evolve the density matrix from the eigen-decomposition of the Liouvillian,
+    for constant hamiltonian and collapse operators.
+    """
+
+    if debug:
+        print(inspect.stack()[0][3])
+
+    #
+    # check initial state
+    #
+    if isket(rho0):
+        rho0 = ket2dm(rho0)
+
+    if issuper(rho0):
+        raise TypeError("The spectral solver does not support " +
+                        "superoperator initial states.")
+
+    #
+    # diagonalize liouvillian
+    #
+    if opt.tidy:
+        H = H.tidyup(opt.atol)
+
+    L = liouvillian(H, c_op_list).full()
+    initial_vector = _state2vec(rho0)
+    eigvals, eigvecs = la.eig(L)
+
+    if np.linalg.cond(eigvecs) > _spectral_cond_max:
+        # defective liouvillian: exp(L dt) = Z exp(T dt) Z^+ from the Schur
+        # form, which is well conditioned
+        dt = _uniform_time_step(tlist)
+        T, Z = la.schur(L, output='complex')
+        U = Z.dot(la.expm(dt * T)).dot(Z.conj().T)
+        r = _PropagatorStepper(U.dot, dt, L.shape[0], initial_vector,
+                               tlist[0])
+        return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar)
+
+    coeffs = la.solve(eigvecs, initial_vector)
+
+    #
+    # prepare output
+    #
+    n_tsteps = len(tlist)
+    output = Result()
+    output.solver = "mesolve"
+    output.times = tlist
+
+    if isinstance(e_ops, types.FunctionType):
+        expt_callback = True
+        store_states = opt.store_states
+    elif isinstance(e_ops, list):
+        expt_callback = False
+        store_states = opt.store_states or len(e_ops) == 0
+    else:
+        raise TypeError("Expectation parameter must be a list or a function")
+
+    times = np.asarray(tlist) - tlist[0]
+    chunk = max(1, _spectral_chunk_size // len(eigvals))
+    progress_bar.start(n_tsteps)
+
+    #
+    # expectation values: sum_j <A|v_j> c_j exp(lambda_j t) for all t at once
+    #
+    if not expt_callback and len(e_ops) > 0:
+        output.expect = []
+        output.num_expect = len(e_ops)
+        amps = _expect_rows(e_ops).dot(eigvecs) * coeffs
+        expect = np.zeros((len(e_ops), n_tsteps), dtype=complex)
+        for k in range(0, n_tsteps, chunk):
+            expect[:, k:k + chunk] = amps.dot(
+                np.exp(np.outer(eigvals, times[k:k + chunk])))
+        for m, op in enumerate(e_ops):
+            if op.isherm and rho0.isherm:
+                output.expect.append(np.real(expect[m]))
+            else:
+                output.expect.append(expect[m])
+
+    #
+    # states, only evaluated if requested
+    #
+    if store_states or expt_callback:
+        if store_states:
+            output.states = StateArray(n_tsteps, rho0.dims,
+                                       getattr(opt, 'states_file', None))
+        for k in range(0, n_tsteps, chunk):
+            vecs = eigvecs.dot(coeffs[:, np.newaxis] *
+                               np.exp(np.outer(eigvals, times[k:k + chunk])))
+            for m in range(vecs.shape[1]):
+                progress_bar.update(k + m)
+                if store_states:
+                    output.states.array[k + m] = vecs[:, m].reshape(rho0.shape)
+                if expt_callback:
+                    e_ops(tlist[k + m],
+                          Qobj(vecs[:, m].reshape(rho0.shape),
+                               dims=rho0.dims, isherm=True))
+
+    progress_bar.finished()
+
+    if opt.store_final_state:
+        vec = eigvecs.dot(coeffs * np.exp(eigvals * times[-1]))
+        output.final_state = Qobj(vec.reshape(rho0.shape), dims=rho0.dims,
+                                  isherm=True)
+
+    return output
+
+
+#
+# evaluate drho(t)/dt according to the master eqaution, used for the real
+# coordinates of the density matrix (see _mesolve_const_real)
+#
+def _ode_rho_func(t, rho, L):
     return L * rho
 
 def _ode_rho_test(t, rho, data):
@@ -837,14 +1951,17 @@ def _ode_rho_test(t, rho, data):
 #
 
 def _ode_super_func(t, y, data):
-    ym = vec2mat(y)
+    # y holds the columns of a dense block, such as a superoperator or a
+    # batch of vectorized density matrices, evolved with one sparse-times-
+    # dense product
+    ym = y.reshape((data.shape[1], -1), order='F')
     return (data*ym).ravel('F')
 
 # -----------------------------------------------------------------------------
 # Master equation solver for python-function time-dependence.
 #
 def _mesolve_func_td(L_func, rho0, tlist, c_op_list, e_ops, args, opt,
-                     progress_bar):
+                     progress_bar, stream=False):
     """
     Evolve the density matrix using an ODE solver with time dependent
     Hamiltonian.
@@ -910,28 +2027,25 @@ def _mesolve_func_td(L_func, rho0, tlist, c_op_list, e_ops, args, opt,
     #
     # setup integrator
     #
-    initial_vector = mat2vec(rho0.full()).ravel('F')
+    initial_vector = _state2vec(rho0)
     if issuper(rho0):
         if not opt.rhs_with_state:
-            r = scipy.integrate.ode(_ode_super_func_td)
+            r = _ode_integrator(_ode_super_func_td, opt)
         else:
-            r = scipy.integrate.ode(_ode_super_func_td_with_state)
+            r = _ode_integrator(_ode_super_func_td_with_state, opt)
     else:
         if not opt.rhs_with_state:
-            r = scipy.integrate.ode(cy_ode_rho_func_td)
+            r = _ode_integrator(cy_ode_rho_func_td, opt)
         else:
-            r = scipy.integrate.ode(_ode_rho_func_td_with_state)
-    r.set_integrator('zvode', method=opt.method, order=opt.order,
-                     atol=opt.atol, rtol=opt.rtol, nsteps=opt.nsteps,
-                     first_step=opt.first_step, min_step=opt.min_step,
-                     max_step=opt.max_step)
+            r = _ode_integrator(_ode_rho_func_td_with_state, opt)
     r.set_initial_value(initial_vector, tlist[0])
     r.set_f_params(L_data, L_func, new_args)
 
     #
     # call generic ODE code
     #
-    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar)
+    return _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                              stream)
 
 
 #
@@ -971,97 +2085,289 @@ def _ode_super_func_td_with_state(t, y, L0, L_func, args):
 # Generic ODE solver: shared code among the various ODE solver
 # -----------------------------------------------------------------------------
 
-def _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar):
+def _ode_integrator(f, opt, jac=None, jac_sparsity=None, real=False):
+    """
+    Set up the integrator selected by the `integrator` attribute of the
+    options (zvode by default) for the right-hand side f(t, y, *f_params),
+    with the interface of scipy.integrate.ode. The sparse matrix jac, if the
+    right-hand side is linear with a constant matrix, is used as the Jacobian
+    by the implicit methods of solve_ivp. Otherwise the sparse matrix
+    jac_sparsity, if given, sets the pattern of the Jacobian they estimate
+    by finite differences. If real, the state is a real vector, integrated by
+    vode in place of zvode.
+    """
+    method = getattr(opt, 'integrator', 'zvode')
+    if method == 'zvode':
+        r = scipy.integrate.ode(f)
+        r.set_integrator('vode' if real else 'zvode',
+                         method=opt.method, order=opt.order,
+                         atol=opt.atol, rtol=opt.rtol, nsteps=opt.nsteps,
+                         first_step=opt.first_step, min_step=opt.min_step,
+                         max_step=opt.max_step)
+        return r
+    if method not in _ivp_methods:
+        raise ValueError("Invalid integrator option: " + str(method))
+    return _IvpIntegrator(f, method, opt, jac, jac_sparsity, real)
+
+
+class _IvpIntegrator(object):
+    """
+    Integrator with the interface of scipy.integrate.ode used by the solvers,
+    which steps one of the solvers of scipy.integrate.solve_ivp and evaluates
+    the state at the requested times with its dense output. BDF and Radau use
+    the constant sparse Jacobian, if given, and keep its LU factorization
+    across steps until the step size changes.
+    """
+
+    def __init__(self, f, method, opt, jac=None, jac_sparsity=None,
+                 real_state=False):
+        self.f = f
+        self.method = method
+        self.opt = opt
+        self.jac = jac
+        self.jac_sparsity = jac_sparsity
+        self.dtype = float if real_state else complex
+        # complex states are split into real and imaginary parts for the
+        # methods that only integrate real systems
+        self.real = method in _ivp_real_methods and not real_state
+        self.f_params = ()
+        self.solver = None
+        self._success = True
+
+    def set_f_params(self, *args):
+        self.f_params = args
+        return self
+
+    def set_initial_value(self, y, t=0.0):
+        self.y = np.asarray(y, dtype=self.dtype)
+        self.t = t
+        self.solver = None
+        self._success = True
+        return self
+
+    def successful(self):
+        return self._success
+
+    def integrate(self, t):
+        if self.solver is None:
+            # created here, as the parameters may be set after the initial
+            # value and the solvers evaluate f when created
+            self.solver = self._create_solver()
+        solver = self.solver
+
+        nsteps = 0
+        while solver.t < t:
+            if nsteps >= self.opt.nsteps or solver.step() is not None:
+                self._success = False
+                return self.y
+            nsteps += 1
+
+        y = solver.dense_output()(t) if solver.t > t else solver.y
+        if self.real:
+            n = len(y) // 2
+            y = y[:n] + 1j * y[n:]
+        self.y = y
+        self.t = t
+        return self.y
+
+    def _create_solver(self):
+        opt = self.opt
+        kwargs = {'rtol': opt.rtol, 'atol': opt.atol}
+        if opt.first_step:
+            kwargs['first_step'] = opt.first_step
+        if opt.max_step:
+            kwargs['max_step'] = opt.max_step
+        if self.jac is not None and self.method in ['BDF', 'Radau']:
+            jac = sp.csc_matrix(self.jac)
+            if self.real:
+                jac = sp.bmat([[jac.real, -jac.imag],
+                               [jac.imag, jac.real]], format='csc')
+            kwargs['jac'] = jac
+        elif self.jac_sparsity is not None and self.method in ['BDF',
+                                                                'Radau']:
+            S = sp.csc_matrix(self.jac_sparsity)
+            S = sp.csc_matrix((np.ones(S.nnz), S.indices, S.indptr),
+                              shape=S.shape)
+            if self.real:
+                S = sp.bmat([[S, S], [S, S]], format='csc')
+            kwargs['jac_sparsity'] = S
+
+        if self.real:
+            y0 = np.concatenate([self.y.real, self.y.imag])
+            fun = self._fun_real
+        else:
+            y0 = self.y
+            fun = self._fun
+        solver_class = getattr(scipy.integrate, self.method)
+        return solver_class(fun, self.t, y0, np.inf, **kwargs)
+
+    def _fun(self, t, y):
+        # the finite difference Jacobian passes columns of a matrix
+        return self.f(t, np.ascontiguousarray(y), *self.f_params)
+
+    def _fun_real(self, t, z):
+        n = len(z) // 2
+        dy = self.f(t, z[:n] + 1j * z[n:], *self.f_params)
+        return np.concatenate([dy.real, dy.imag])
+
+
+def _expect_rows(e_ops):
+    """
+    Stack the vectorized operators vec(A^T) as the rows of a sparse matrix, so
+    that its product with a vectorized density matrix gives all the
+    expectation values Tr(A rho) at once.
+    """
+    return sp.vstack([operator_to_vector(op).data.T for op in e_ops],
+                     format='csr')
+
+
+def _state2vec(rho0):
+    """
+    Vectorize the initial state for the ODE solvers: row-stacked for density
+    matrices, which is the ordering the Liouvillian acts on, and
+    column-stacked for superoperators, as evolved by `_ode_super_func`.
+    """
+    if issuper(rho0):
+        return rho0.full().ravel('F')
+    return rho0.full().ravel()
+
+
+def _vec2state(y, rho0):
+    """
+    Reshape the ODE state vector into the state it represents: the row-stacked
+    density matrix, or the column-stacked superoperator if `rho0` is one.
+    """
+    if issuper(rho0):
+        return y.reshape(rho0.shape, order='F')
+    return y.reshape(rho0.shape)
+
+
+def _ode_steps(r, tlist, progress_bar):
+    """
+    Advance the ODE solver (r) through tlist, yielding the index and time of
+    each step while r.y holds the state at that time.
+    """
+    n_tsteps = len(tlist)
+    progress_bar.start(n_tsteps)
+
+    dt = np.diff(tlist)
+    for t_idx, t in enumerate(tlist):
+        progress_bar.update(t_idx)
+
+        if not r.successful():
+            raise Exception("ODE integration error: Try to increase "
+                            "the allowed number of substeps by increasing "
+                            "the nsteps parameter in the Options class.")
+
+        yield t_idx, t
+
+        if t_idx < n_tsteps - 1:
+            r.integrate(r.t + dt[t_idx])
+
+    progress_bar.finished()
+
+
+def _generic_ode_stream(r, rho0, tlist, e_ops, opt, progress_bar):
+    """
+    Internal function for streaming the solution of the ME. Yield the time and
+    either the expectation values or a copy of the state vector at each time
+    step. See _generic_ode_solve.
+    """
+    if isinstance(e_ops, list) and len(e_ops) > 0:
+        e_rows = _expect_rows(e_ops)
+        real = rho0.isherm and all(op.isherm for op in e_ops)
+    else:
+        e_rows = None
+
+    try:
+        for t_idx, t in _ode_steps(r, tlist, progress_bar):
+            if e_rows is not None:
+                expect = e_rows * r.y
+                yield t, (np.real(expect) if real else expect)
+            else:
+                if isinstance(e_ops, types.FunctionType):
+                    e_ops(t, Qobj(_vec2state(r.y, rho0), dims=rho0.dims,
+                                  isherm=True))
+                yield t, r.y.copy()
+    finally:
+        if (not opt.rhs_reuse) and (config.tdname is not None):
+            _cython_build_cleanup(config.tdname)
+
+
+def _generic_ode_solve(r, rho0, tlist, e_ops, opt, progress_bar,
+                       stream=False):
     """
     Internal function for solving ME. Solve an ODE which solver parameters
     already setup (r). Calculate the required expectation values or invoke
-    callback function at each time step.
+    callback function at each time step. If stream is True, return a
+    generator of the results instead (see _generic_ode_stream).
     """
 
+    if not isinstance(e_ops, (types.FunctionType, list)):
+        raise TypeError("Expectation parameter must be a list or a function")
+
+    if stream:
+        return _generic_ode_stream(r, rho0, tlist, e_ops, opt, progress_bar)
+
     #
     # prepare output array
     #
     n_tsteps = len(tlist)
-    e_sops_data = []
 
     output = Result()
     output.solver = "mesolve"
     output.times = tlist
 
-    if opt.store_states:
-        output.states = []
-
     if isinstance(e_ops, types.FunctionType):
         n_expt_op = 0
         expt_callback = True
 
-    elif isinstance(e_ops, list):
+    else:
 
         n_expt_op = len(e_ops)
         expt_callback = False
 
         if n_expt_op == 0:
             # fall back on storing states
-            output.states = []
             opt.store_states = True
         else:
             output.expect = []
             output.num_expect = n_expt_op
-            for op in e_ops:
-                e_sops_data.append(spre(op).data)
-                if op.isherm and rho0.isherm:
-                    output.expect.append(np.zeros(n_tsteps))
-                else:
-                    output.expect.append(np.zeros(n_tsteps, dtype=complex))
+            e_rows = _expect_rows(e_ops)
+            expect = np.zeros((n_expt_op, n_tsteps), dtype=complex)
 
-    else:
-        raise TypeError("Expectation parameter must be a list or a function")
+    if opt.store_states:
+        output.states = StateArray(n_tsteps, rho0.dims,
+                                   getattr(opt, 'states_file', None))
 
     #
     # start evolution
     #
-    progress_bar.start(n_tsteps)
-
-    rho = Qobj(rho0)
-
-    dt = np.diff(tlist)
-    for t_idx, t in enumerate(tlist):
-        progress_bar.update(t_idx)
+    for t_idx, t in _ode_steps(r, tlist, progress_bar):
 
-        if not r.successful():
-            raise Exception("ODE integration error: Try to increase "
-                            "the allowed number of substeps by increasing "
-                            "the nsteps parameter in the Options class.")
+        if opt.store_states:
+            output.states.array[t_idx] = _vec2state(r.y, rho0)
 
-        if opt.store_states or expt_callback:
-            rho.data = dense2D_to_fastcsr_fmode(vec2mat(r.y), rho.shape[0], rho.shape[1])
+        if expt_callback:
+            # use callback method
+            e_ops(t, Qobj(_vec2state(r.y, rho0), dims=rho0.dims,
+                          isherm=True))
 
-            if opt.store_states:
-                output.states.append(Qobj(rho, isherm=True))
+        if n_expt_op > 0:
+            expect[:, t_idx] = e_rows * r.y
 
-            if expt_callback:
-                # use callback method
-                e_ops(t, rho)
-
-        for m in range(n_expt_op):
-            if output.expect[m].dtype == complex:
-                output.expect[m][t_idx] = expect_rho_vec(e_sops_data[m],
-                                                         r.y, 0)
-            else:
-                output.expect[m][t_idx] = expect_rho_vec(e_sops_data[m],
-                                                         r.y, 1)
-
-        if t_idx < n_tsteps - 1:
-            r.integrate(r.t + dt[t_idx])
-
-    progress_bar.finished()
+    for m in range(n_expt_op):
+        if e_ops[m].isherm and rho0.isherm:
+            output.expect.append(np.real(expect[m]))
+        else:
+            output.expect.append(expect[m])
 
     if (not opt.rhs_reuse) and (config.tdname is not None):
         _cython_build_cleanup(config.tdname)
 
     if opt.store_final_state:
-        rho.data = dense2D_to_fastcsr_fmode(vec2mat(r.y), rho.shape[0], rho.shape[1])
-        output.final_state = Qobj(rho, dims=rho0.dims, isherm=True)
+        output.final_state = Qobj(_vec2state(r.y, rho0), dims=rho0.dims,
+                                  isherm=True)
 
     return output
 
@@ -1155,12 +2461,8 @@ def _mesolve_list_td(H_func, rho0, tlist, c_op_list, e_ops, args, opt,
     #
     # setup integrator
     #
-    initial_vector = mat2vec(rho0.full()).ravel()
-    r = scipy.integrate.ode(config.tdfunc)
-    r.set_integrator('zvode', method=opt.method, order=opt.order,
-                     atol=opt.atol, rtol=opt.rtol, nsteps=opt.nsteps,
-                     first_step=opt.first_step, min_step=opt.min_step,
-                     max_step=opt.max_step)
+    initial_vector = _state2vec(rho0)
+    r = _ode_integrator(config.tdfunc, opt)
     r.set_initial_value(initial_vector, tlist[0])
     code = compile('r.set_f_params(' + string + ')', '<string>', 'exec')
     exec(code)
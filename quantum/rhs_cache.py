@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# This file is part of Quantum.
+#
+#    Copyright (c) 2017, Diego Nicolás Bernal-García
+#    All rights reserved.
+#
+#    Redistribution and use in source and binary forms, with or without
+#    modification, are permitted provided that the following conditions are
+#    met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#
+#    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#    "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#    LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+#    PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#    HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#    LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#    THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#    (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#    OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+"""
+This module contains a persistent cache for the Cython modules compiled for
+the right-hand side of time-dependent problems in string format.
+"""
+
+__all__ = ['rhs_cache_dir', 'cached_rhs', 'clear_rhs_cache']
+
+
+import os
+import sys
+import glob
+import shutil
+import hashlib
+import tempfile
+import importlib.util
+from importlib.machinery import EXTENSION_SUFFIXES
+import numpy as np
+import Cython
+import pyximport
+import qutip
+
+# maximum size in bytes of the compiled modules kept in the cache
+_cache_size = 256 * 2 ** 20
+
+
+def rhs_cache_dir():
+    """Returns the directory of the compiled right-hand side cache.
+
+    The directory is given by the `QUANTUM_CACHE_DIR` environment variable,
+    or is the `quantum/rhs` folder of the user cache directory
+    (`XDG_CACHE_HOME`, by default `~/.cache`). It is created if needed.
+
+    Returns
+    -------
+    path : str
+        Path to the cache directory.
+    """
+    path = os.environ.get('QUANTUM_CACHE_DIR')
+    if path is None:
+        base = os.environ.get('XDG_CACHE_HOME',
+                              os.path.join(os.path.expanduser('~'), '.cache'))
+        path = os.path.join(base, 'quantum', 'rhs')
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # created concurrently by another process
+            if not os.path.isdir(path):
+                raise
+    return path
+
+
+def cached_rhs(cgen, max_size=None):
+    """Returns the compiled right-hand side of a time-dependent problem,
+    compiling it only if it is not in the cache.
+
+    The code generated by `cgen` is hashed together with the versions of
+    Python, Cython, NumPy and QuTiP, so that the key covers the coefficient
+    strings, the number of terms and the OpenMP settings, while the values of
+    the arguments, passed at call time, do not matter. A parameter sweep, or
+    any later run in another process, thus reuses the same module. Modules
+    are compiled in a private folder and moved into the cache atomically,
+    which makes concurrent runs safe, and the least recently used ones are
+    evicted when the cache exceeds `max_size`.
+
+    Parameters
+    ----------
+    cgen : qutip.cy.codegen.Codegen
+        Code generator of the right-hand side, not yet generated.
+
+    max_size : int, optional
+        Maximum size of the cache in bytes.
+
+    Returns
+    -------
+    cy_td_ode_rhs : function
+        Compiled right-hand side.
+    """
+    cache_dir = rhs_cache_dir()
+    build_dir = tempfile.mkdtemp(prefix='build-', dir=cache_dir)
+    try:
+        pyx_file = os.path.join(build_dir, 'rhs.pyx')
+        cgen.generate(pyx_file)
+        with open(pyx_file, 'rb') as f:
+            name = 'rhs_' + _rhs_key(f.read())
+
+        if name in sys.modules:
+            return sys.modules[name].cy_td_ode_rhs
+
+        path = os.path.join(cache_dir, name + EXTENSION_SUFFIXES[0])
+        try:
+            module = _load_module(name, path)
+            os.utime(path, None)
+        except (IOError, OSError, ImportError):
+            module_pyx = os.path.join(build_dir, name + '.pyx')
+            os.rename(pyx_file, module_pyx)
+            so_file = pyximport.build_module(name, module_pyx,
+                                             pyxbuild_dir=build_dir)
+            os.replace(so_file, path)
+            _evict(cache_dir, _cache_size if max_size is None else max_size,
+                   keep=path)
+            module = _load_module(name, path)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    return module.cy_td_ode_rhs
+
+
+def clear_rhs_cache():
+    """Removes all the compiled modules from the cache.
+    """
+    for path in _cache_entries(rhs_cache_dir()):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _rhs_key(source):
+    """
+    Hash of the generated code and of the versions it is compiled against.
+    """
+    h = hashlib.sha256(source)
+    for version in [sys.version, Cython.__version__, np.__version__,
+                    qutip.__version__]:
+        h.update(version.encode())
+    return h.hexdigest()[:32]
+
+
+def _load_module(name, path):
+    """
+    Import the extension module `name` from the file `path`.
+    """
+    if not os.path.exists(path):
+        raise ImportError("No compiled module " + path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    sys.modules[name] = module
+    return module
+
+
+def _cache_entries(cache_dir):
+    return glob.glob(os.path.join(cache_dir, 'rhs_*' + EXTENSION_SUFFIXES[0]))
+
+
+def _evict(cache_dir, max_size, keep=None):
+    """
+    Remove the least recently used modules until the cache fits in max_size.
+    """
+    entries = []
+    for path in _cache_entries(cache_dir):
+        try:
+            entries.append((os.path.getmtime(path), os.path.getsize(path),
+                            path))
+        except OSError:
+            # evicted concurrently by another process
+            pass
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# This file is part of Quantum.
+#
+#    Copyright (c) 2017, Diego Nicolás Bernal-García
+#    All rights reserved.
+#
+#    Redistribution and use in source and binary forms, with or without
+#    modification, are permitted provided that the following conditions are
+#    met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#
+#    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#    "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#    LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+#    PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#    HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#    LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#    THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#    (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#    OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+"""
+This module contains the functions used to calculate the power spectrum of
+the stationary two-time correlation functions from the Green operator of the
+Liouvillian.
+"""
+
+__all__ = ['spectrum']
+
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.linalg as la
+from qutip.qobj import issuper
+from qutip.expect import expect
+from quantum.superoperator import liouvillian, _block_labels
+from quantum.steadystate import steadystate
+
+# number of elements of the (eigenvalues x frequencies) array evaluated at
+# once by the eigen method
+_chunk_size = 2 ** 22
+
+
+def spectrum(H, wlist, c_ops, a_op, b_op, method='eigen'):
+    """Calculates the spectrum of the stationary correlation function
+    :math:`\\left<A(\\tau)B(0)\\right>`, i.e., its Fourier transform
+
+    .. math::
+    S(\\omega) = \\int_{-\\infty}^{\\infty}
+    \\left<A(\\tau)B(0)\\right> e^{-i\\omega\\tau} d\\tau
+    = -2 \\mathrm{Re} \\, \\mathrm{Tr}[A (L - i\\omega)^{-1}
+    (B \\rho_{ss} - \\left<B\\right> \\rho_{ss})],
+
+    with the Green operator of the Liouvillian (the resolvent), for
+    :math:`A = B^\\dagger`. As in the 'es' solver of qutip, the coherent part
+    :math:`\\left<A\\right>\\left<B\\right>` is removed.
+
+    The resolvent only acts on the blocks of the Liouvillian (see
+    :func:`quantum.liouvillian_blocks`) in which :math:`B \\rho_{ss}` does
+    not vanish, e.g. the coherences between neighbouring excitation
+    manifolds for a destruction operator B. Each of them is decomposed once,
+    and the whole frequency grid is then evaluated as an array operation.
+
+    Parameters
+    ----------
+    H : qobj
+        System Hamiltonian, or Liouvillian (then `c_ops` is ignored).
+    wlist : array_like
+        List of frequencies for :math:`\\omega`.
+    c_ops : list
+        List of collapse operators.
+    a_op : qobj
+        Operator A.
+    b_op : qobj
+        Operator B.
+    method : str {'eigen', 'schur'}
+        'eigen' (default) diagonalizes the blocks, so that every frequency
+        costs O(n) for a block of dimension n. 'schur' reduces them to
+        triangular form, which is robust for Liouvillians that are far from
+        normal, and solves a triangular system, O(n^2), per frequency.
+
+    Returns
+    -------
+    spectrum : array
+        An array with spectrum :math:`S(\\omega)` for the frequencies
+        specified in `wlist`.
+    """
+    if method not in ['eigen', 'schur']:
+        raise ValueError('Invalid method argument for spectrum.')
+
+    L = H if issuper(H) else liouvillian(H, c_ops)
+    rhoss = steadystate(L)
+    n = rhoss.shape[0]
+
+    # B rho_ss without its steady state component, which has zero trace
+    rho_vec = rhoss.full().ravel()
+    x = (b_op * rhoss).full().ravel() - expect(b_op, rhoss) * rho_vec
+    a_row = a_op.full().T.ravel()
+    trace_row = np.zeros(n ** 2)
+    trace_row[::n + 1] = 1
+
+    data = sp.csr_matrix(L.data)
+    labels = _block_labels(data)
+    wlist = np.asarray(wlist, dtype=float)
+    spec = np.zeros(len(wlist))
+    for label in np.unique(labels[x != 0]):
+        idx = np.nonzero(labels == label)[0]
+        L_block = data[idx, :][:, idx].toarray()
+        if labels[0] == label:
+            # shift the zero eigenvalue of the steady state away, which
+            # leaves the resolvent on traceless matrices unchanged
+            shift = max(np.abs(np.diag(L_block)).max(), 1.0)
+            L_block -= shift * np.outer(rho_vec[idx], trace_row[idx])
+        if method == 'eigen':
+            spec += _spectrum_eigen(L_block, a_row[idx], x[idx], wlist)
+        else:
+            spec += _spectrum_schur(L_block, a_row[idx], x[idx], wlist)
+
+    return spec
+
+
+def _spectrum_eigen(L, a, x, wlist):
+    """
+    Spectrum of a block from the eigendecomposition L = V diag(lam) V^-1, as
+    the sum of the Lorentzians -2 Re s_k / (lam_k - i w).
+    """
+    lam, V = la.eig(L)
+    s = a.dot(V) * la.solve(V, x)
+    spec = np.empty(len(wlist))
+    step = max(_chunk_size // len(lam), 1)
+    for k in range(0, len(wlist), step):
+        w = wlist[k:k + step]
+        spec[k:k + step] = -2 * np.real(
+            s.dot(1.0 / (lam[:, np.newaxis] - 1j * w[np.newaxis, :])))
+    return spec
+
+
+def _spectrum_schur(L, a, x, wlist):
+    """
+    Spectrum of a block from the Schur decomposition L = Z T Z^dagger, with
+    one triangular solve per frequency.
+    """
+    T, Z = la.schur(L, output='complex')
+    y = Z.conj().T.dot(x)
+    az = a.dot(Z)
+    diag = np.diag(T).copy()
+    spec = np.empty(len(wlist))
+    for k, w in enumerate(wlist):
+        np.fill_diagonal(T, diag - 1j * w)
+        spec[k] = -2 * np.real(az.dot(la.solve_triangular(T, y)))
+    return spec
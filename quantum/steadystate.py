@@ -69,11 +69,13 @@ collapse operators.
 # The only substantial change is the use of my liouvillian function!
 
 
-__all__ = ['steadystate', 'steady', 'build_preconditioner',
-           'pseudo_inverse']
+__all__ = ['steadystate', 'steadystate_sweep', 'steadystate_truncation',
+           'steady', 'build_preconditioner', 'pseudo_inverse']
 
 import warnings
 import time
+import hashlib
+from collections import OrderedDict
 import scipy
 import numpy as np
 from numpy.linalg import svd
@@ -83,8 +85,12 @@ import scipy.linalg as la
 from scipy.sparse.linalg import (use_solver, splu, spilu, spsolve, eigs)
 from scipy.sparse.linalg import (LinearOperator, gmres, lgmres, bicgstab)
 
-from quantum.superoperator import (liouvillian, vec2mat, mat2vec, spre,
-                                   operator_to_vector)
+from quantum.superoperator import (liouvillian, spre, LiouvillianTemplate,
+                                   liouvillian_action, hermitian_basis,
+                                   real_liouvillian, _block_labels,
+                                   _effective_hamiltonians)
+from quantum.frame import rotating_frame
+from quantum.manifold import basis_index
 
 from qutip.qobj import Qobj, issuper, isoper
 from qutip.sparse import (sp_permute, sp_bandwidth, sp_reshape, sp_profile)
@@ -93,7 +99,6 @@ from qutip.graph import reverse_cuthill_mckee, weighted_bipartite_matching
 from qutip import (tensor, identity)
 import qutip.settings as settings
 from qutip.utilities import _version2int
-from qutip.cy.spconvert import dense2D_to_fastcsr_fmode
 
 
 # Load MKL spsolve if avaiable
@@ -103,6 +108,13 @@ if settings.has_mkl:
 # test if scipy is recent enought to get L & U factors from superLU
 _scipy_check = _version2int(scipy.__version__) >= _version2int('0.14.0')
 
+# orderings of the LU based solvers (WBM, RCM and the column permutation of
+# superLU) keyed by the sparsity pattern of the matrix, so that parameter
+# sweeps only pay for the numeric factorization
+_factorization_cache = OrderedDict()
+_factorization_cache_size = 32
+_factorization_stats = {'hits': 0, 'misses': 0}
+
 
 def _empty_info_dict():
     def_info = {'perm': [], 'solution_time': None, 'iterations': None,
@@ -121,7 +133,8 @@ def _default_steadystate_args():
                 'fill_factor': 100, 'diag_pivot_thresh': None, 'maxiter': 1000,
                 'tol': 1e-12, 'permc_spec': 'COLAMD', 'ILU_MILU': 'smilu_2',
                 'restart': 20, 'return_info': False,
-                'info': _empty_info_dict(), 'verbose': False}
+                'info': _empty_info_dict(), 'verbose': False, 'frame': None,
+                'blocks': None, 'reuse_factorization': True, 'real': False}
 
     return def_args
 
@@ -135,19 +148,25 @@ def steadystate(A, c_op_list=[], **kwargs):
     Parameters
     ----------
     A : qobj
-        A Hamiltonian or Liouvillian operator.
+        A Hamiltonian or Liouvillian operator, or a
+        :class:`quantum.LiouvillianTemplate` at its current parameters.
     c_op_list : list
         A list of collapse operators.
     method : str {'direct', 'eigen', 'iterative-gmres',
                   'iterative-lgmres', 'iterative-bicgstab', 'svd', 'power',
-                  'power-gmres', 'power-lgmres', 'power-bicgstab'}
+                  'power-gmres', 'power-lgmres', 'power-bicgstab',
+                  'matrix-free'}
         Method for solving the underlying linear equation. Direct LU solver
         'direct' (default), sparse eigenvalue problem 'eigen',
         iterative GMRES method 'iterative-gmres', iterative LGMRES method
         'iterative-lgmres', iterative BICGSTAB method 'iterative-bicgstab',
         SVD 'svd' (dense), or inverse-power method 'power'. The iterative
         power methods 'power-gmres', 'power-lgmres', 'power-bicgstab' use
-        the same solvers as their direct counterparts.
+        the same solvers as their direct counterparts. The 'matrix-free'
+        method runs GMRES on the action of the Liouvillian on N x N density
+        matrices and never assembles it; it requires a Hamiltonian and
+        collapse operators, and with `use_precond` it is preconditioned by
+        the Sylvester equation of the effective Hamiltonian.
     return_info : bool, optional, default = False
         Return a dictionary of solver-specific infomation about the
         solution and how it was obtained.
@@ -205,6 +224,30 @@ def steadystate(A, c_op_list=[], **kwargs):
         ITERATIVE ONLY. Selects the incomplete LU decomposition method
         algoithm used in creating the preconditoner. Should only be used by
         advanced users.
+    frame : qobj, optional
+        Diagonal operator that defines a rotating frame (see
+        :func:`quantum.rotating_frame`), e.g. the total number of excitations
+        times a bare frequency. Removing the large bare frequencies improves
+        the conditioning of the Liouvillian. The Hamiltonian must be constant
+        in the rotating frame, and the steady state is returned in it.
+    blocks : bool or qobj, optional
+        DIRECT ONLY. Solve only for the block of the Liouvillian that holds
+        the populations (see :func:`quantum.liouvillian_blocks`), the only one
+        in which the steady state does not vanish. True finds the blocks from
+        the sparsity pattern of the Liouvillian, and a diagonal charge
+        operator, such as the number of excitations, groups the coherences by
+        charge difference.
+    reuse_factorization : bool, optional, default = True
+        Reuse the orderings (WBM, RCM and the column permutation of superLU)
+        of previous LU based solutions for Liouvillians with the same
+        sparsity pattern, e.g. along a parameter sweep, so that only the
+        numeric factorization is repeated. The number of cache hits and
+        misses is recorded in the `info` dictionary.
+    real : bool, optional, default = False
+        Solve with the direct method in the N^2 real coordinates of the
+        Hermitian density matrix (see :func:`quantum.real_liouvillian`), so
+        that the LU factorization runs in real arithmetic. Only the Hermitian
+        part of the Hamiltonian is kept.
     Returns
     -------
     dm : qobj
@@ -228,6 +271,27 @@ def steadystate(A, c_op_list=[], **kwargs):
     if ss_args['use_rcm'] and ('permc_spec' not in kwargs.keys()):
         ss_args['permc_spec'] = 'NATURAL'
 
+    # blocks=False means the same as the default, no splitting
+    if not ss_args['blocks']:
+        ss_args['blocks'] = None
+
+    # A template stands for its Liouvillian at the current parameters
+    if isinstance(A, LiouvillianTemplate):
+        A = A.liouvillian()
+
+    # Move to the rotating frame, where the steady state is stationary
+    if ss_args['frame'] is not None:
+        if not isoper(A):
+            raise TypeError('The rotating frame requires a Hamiltonian.')
+        A, c_op_list = rotating_frame(A, c_op_list, ss_args['frame'])
+        if isinstance(A, list):
+            raise ValueError('The Hamiltonian is time-dependent in the ' +
+                             'rotating frame: the frame must commute with ' +
+                             'the Hamiltonian.')
+
+    if ss_args['method'] == 'matrix-free':
+        return _steadystate_matrix_free(A, c_op_list, ss_args)
+
     # Create & check Liouvillian
     A = _steadystate_setup(A, c_op_list)
 
@@ -237,6 +301,17 @@ def steadystate(A, c_op_list=[], **kwargs):
         ss_args['weight'] = np.mean(np.abs(A.data.data.max()))
         ss_args['info']['weight'] = ss_args['weight']
 
+    if ss_args['real']:
+        if ss_args['method'] != 'direct' or ss_args['blocks'] is not None:
+            raise ValueError('Only the direct method can solve in the real ' +
+                             'representation, and not by blocks.')
+        return _steadystate_direct_real(A, ss_args)
+
+    if ss_args['blocks'] is not None:
+        if ss_args['method'] != 'direct':
+            raise ValueError('Only the direct method can solve by blocks.')
+        return _steadystate_direct_block(A, ss_args)
+
     if ss_args['method'] == 'direct':
         if ss_args['sparse']:
             return _steadystate_direct_sparse(A, ss_args)
@@ -261,6 +336,16 @@ def steadystate(A, c_op_list=[], **kwargs):
         raise ValueError('Invalid method argument for steadystate.')
 
 
+def _vec2rho(vec):
+    """
+    Density matrix from its vectorization, on which the Liouvillian acts by
+    rows (see quantum.superoperator.liouvillian).
+    """
+    vec = np.asarray(vec).ravel()
+    n = int(np.sqrt(len(vec)))
+    return vec.reshape((n, n))
+
+
 def _steadystate_setup(A, c_op_list):
     """Build Liouvillian (if necessary) and check input.
     """
@@ -278,6 +363,65 @@ def _steadystate_setup(A, c_op_list):
                         'Liouvillian (super) operators')
 
 
+def _pattern_key(A, *options):
+    """
+    Hash of the sparsity pattern of a sparse matrix and of the options that
+    determine its orderings.
+    """
+    A.sort_indices()
+    key = hashlib.sha1(repr((A.format, A.shape) + options).encode())
+    key.update(A.indptr.tobytes())
+    key.update(A.indices.tobytes())
+    return key.hexdigest()
+
+
+def _cached_orderings(key, ss_args):
+    """
+    Entry of the factorization cache for the key, a new one on a miss, and
+    record the hits and misses in the info dictionary.
+    """
+    if not ss_args['reuse_factorization']:
+        return {}
+    if key in _factorization_cache:
+        _factorization_cache.move_to_end(key)
+        _factorization_stats['hits'] += 1
+        ss_args['info']['factorization_cache'] = 'hit'
+    else:
+        _factorization_cache[key] = {}
+        while len(_factorization_cache) > _factorization_cache_size:
+            _factorization_cache.popitem(last=False)
+        _factorization_stats['misses'] += 1
+        ss_args['info']['factorization_cache'] = 'miss'
+    ss_args['info']['cache_hits'] = _factorization_stats['hits']
+    ss_args['info']['cache_misses'] = _factorization_stats['misses']
+    return _factorization_cache[key]
+
+
+def _splu_cached(A, ss_args):
+    """
+    LU factorization with superLU that reuses the column permutation of the
+    cache entry found by the Liouvillian setup, if any. Returns a function
+    that solves the system for a right-hand side.
+    """
+    orderings = ss_args.get('orderings', {})
+    options = dict(diag_pivot_thresh=ss_args['diag_pivot_thresh'],
+                   options=dict(ILU_MILU=ss_args['ILU_MILU']))
+    if 'perm_c' in orderings:
+        # the columns are already in the order of the first factorization
+        perm_c = orderings['perm_c']
+        lu = splu(A[:, perm_c], permc_spec='NATURAL', **options)
+
+        def solve(b):
+            x = np.empty_like(b)
+            x[perm_c] = lu.solve(b)
+            return x
+    else:
+        lu = splu(A, permc_spec=ss_args['permc_spec'], **options)
+        orderings['perm_c'] = np.argsort(lu.perm_c)
+        solve = lu.solve
+    return lu, solve
+
+
 def _steadystate_LU_liouvillian(L, ss_args, has_mkl=0):
     """Creates modified Liouvillian for LU based SS methods.
     """
@@ -298,6 +442,11 @@ def _steadystate_LU_liouvillian(L, ss_args, has_mkl=0):
                                                             for nn in range(n)])),
             shape=(n ** 2, n ** 2))
 
+    orderings = _cached_orderings(
+        _pattern_key(L, 'LU', ss_args['use_wbm'], ss_args['use_rcm'],
+                     ss_args['permc_spec']), ss_args)
+    ss_args['orderings'] = orderings
+
     if settings.debug:
         old_band = sp_bandwidth(L)[0]
         old_pro = sp_profile(L)[0]
@@ -309,7 +458,9 @@ def _steadystate_LU_liouvillian(L, ss_args, has_mkl=0):
         if settings.debug:
             logger.debug('Calculating Weighted Bipartite Matching ordering...')
         _wbm_start = time.time()
-        perm = weighted_bipartite_matching(L)
+        if 'wbm' not in orderings:
+            orderings['wbm'] = weighted_bipartite_matching(L)
+        perm = orderings['wbm']
         _wbm_end = time.time()
         L = sp_permute(L, perm, [], form)
         ss_args['info']['perm'].append('wbm')
@@ -322,7 +473,9 @@ def _steadystate_LU_liouvillian(L, ss_args, has_mkl=0):
         if settings.debug:
             logger.debug('Calculating Reverse Cuthill-Mckee ordering...')
         _rcm_start = time.time()
-        perm2 = reverse_cuthill_mckee(L)
+        if 'rcm' not in orderings:
+            orderings['rcm'] = reverse_cuthill_mckee(L)
+        perm2 = orderings['rcm']
         _rcm_end = time.time()
         rev_perm = np.argsort(perm2)
         L = sp_permute(L, perm2, perm2, form)
@@ -384,10 +537,8 @@ def _steadystate_direct_sparse(L, ss_args):
         # Use superLU solver
         orig_nnz = L.nnz
         _direct_start = time.time()
-        lu = splu(L, permc_spec=ss_args['permc_spec'],
-                  diag_pivot_thresh=ss_args['diag_pivot_thresh'],
-                  options=dict(ILU_MILU=ss_args['ILU_MILU']))
-        v = lu.solve(b)
+        lu, solve = _splu_cached(L, ss_args)
+        v = solve(b)
         _direct_end = time.time()
         ss_args['info']['solution_time'] = _direct_end - _direct_start
         if (settings.debug or ss_args['return_info']) and _scipy_check:
@@ -416,7 +567,7 @@ def _steadystate_direct_sparse(L, ss_args):
     if ss_args['use_rcm']:
         v = v[np.ix_(rev_perm,)]
 
-    data = dense2D_to_fastcsr_fmode(vec2mat(v), n, n)
+    data = sp.csr_matrix(_vec2rho(v))
     data = 0.5 * (data + data.H)
     if ss_args['return_info']:
         return Qobj(data, dims=dims, isherm=True), ss_args['info']
@@ -424,6 +575,86 @@ def _steadystate_direct_sparse(L, ss_args):
         return Qobj(data, dims=dims, isherm=True)
 
 
+def _steadystate_direct_block(L, ss_args):
+    """
+    Direct solver restricted to the block of the Liouvillian that holds the
+    populations, which is the only one in which the steady state does not
+    vanish.
+    """
+    dims = L.dims[0]
+    n = int(np.sqrt(L.shape[0]))
+    charge = ss_args['blocks']
+    data = sp.csr_matrix(L.data)
+    labels = _block_labels(data, None if charge is True else charge)
+
+    populations = np.arange(n) * (n + 1)
+    if np.any(labels[populations] != labels[0]):
+        raise ValueError('The populations are split over several blocks: ' +
+                         'the steady state is not unique.')
+    idx = np.nonzero(labels == labels[0])[0]
+    L_block = data[idx, :][:, idx]
+
+    # unity trace condition on the first row of the block, which is that of
+    # the first population
+    m = len(idx)
+    b = np.zeros(m, dtype=complex)
+    b[0] = ss_args['weight']
+    L_block = L_block.tocsc() + sp.csc_matrix(
+        (ss_args['weight'] * np.ones(n),
+         (np.zeros(n), np.searchsorted(idx, populations))), shape=(m, m))
+
+    ss_args['orderings'] = _cached_orderings(
+        _pattern_key(L_block, 'blocks', ss_args['permc_spec']), ss_args)
+    ss_args['info']['permc_spec'] = ss_args['permc_spec']
+    _direct_start = time.time()
+    lu, solve = _splu_cached(L_block, ss_args)
+    v = solve(b)
+    _direct_end = time.time()
+    ss_args['info']['solution_time'] = _direct_end - _direct_start
+    if ss_args['return_info']:
+        ss_args['info']['residual_norm'] = la.norm(b - L_block * v, np.inf)
+
+    vec = np.zeros(n ** 2, dtype=complex)
+    vec[idx] = v
+    data = _vec2rho(vec)
+    data = 0.5 * (data + data.conj().T)
+    if ss_args['return_info']:
+        return Qobj(data, dims=dims, isherm=True), ss_args['info']
+    else:
+        return Qobj(data, dims=dims, isherm=True)
+
+
+def _steadystate_direct_real(L, ss_args):
+    """
+    Direct solver in the real coordinates of the Hermitian density matrix,
+    whose first N entries are the populations.
+    """
+    dims = L.dims[0]
+    n = int(np.sqrt(L.shape[0]))
+    L_real = real_liouvillian(L).tocsc() + sp.csc_matrix(
+        (ss_args['weight'] * np.ones(n), (np.zeros(n), np.arange(n))),
+        shape=(n ** 2, n ** 2))
+    b = np.zeros(n ** 2)
+    b[0] = ss_args['weight']
+
+    ss_args['orderings'] = _cached_orderings(
+        _pattern_key(L_real, 'real', ss_args['permc_spec']), ss_args)
+    ss_args['info']['permc_spec'] = ss_args['permc_spec']
+    _direct_start = time.time()
+    lu, solve = _splu_cached(L_real, ss_args)
+    v = solve(b)
+    _direct_end = time.time()
+    ss_args['info']['solution_time'] = _direct_end - _direct_start
+    if ss_args['return_info']:
+        ss_args['info']['residual_norm'] = la.norm(b - L_real * v, np.inf)
+
+    data = _vec2rho(hermitian_basis(n) * v)
+    if ss_args['return_info']:
+        return Qobj(data, dims=dims, isherm=True), ss_args['info']
+    else:
+        return Qobj(data, dims=dims, isherm=True)
+
+
 def _steadystate_direct_dense(L, ss_args):
     """
     Direct solver that use numpy dense matrices. Suitable for
@@ -445,7 +676,7 @@ def _steadystate_direct_dense(L, ss_args):
     ss_args['info']['solution_time'] = _dense_end - _dense_start
     if ss_args['return_info']:
         ss_args['info']['residual_norm'] = la.norm(b - L * v, np.inf)
-    data = vec2mat(v)
+    data = _vec2rho(v)
     data = 0.5 * (data + data.conj().T)
 
     return Qobj(data, dims=dims, isherm=True)
@@ -487,8 +718,7 @@ def _steadystate_eigen(L, ss_args):
         ss_args['info']['residual_norm'] = la.norm(L * eigvec, np.inf)
     if ss_args['use_rcm']:
         eigvec = eigvec[np.ix_(rev_perm,)]
-    _temp = vec2mat(eigvec)
-    data = dense2D_to_fastcsr_fmode(_temp, _temp.shape[0], _temp.shape[1])
+    data = sp.csr_matrix(_vec2rho(eigvec))
     data = 0.5 * (data + data.H)
     out = Qobj(data, dims=dims, isherm=True)
     if ss_args['return_info']:
@@ -573,6 +803,11 @@ def _steadystate_iterative(L, ss_args):
         b = b[np.ix_(perm,)]
     if np.any(perm2):
         b = b[np.ix_(perm2,)]
+    if ss_args['x0'] is not None:
+        # the initial guess is a density matrix, vectorized by rows
+        ss_args['x0'] = np.asarray(ss_args['x0'], dtype=complex).ravel()
+        if np.any(perm2):
+            ss_args['x0'] = ss_args['x0'][np.ix_(perm2,)]
 
     use_solver(assumeSortedIndices=True)
 
@@ -629,7 +864,118 @@ def _steadystate_iterative(L, ss_args):
     if ss_args['use_rcm']:
         v = v[np.ix_(rev_perm,)]
 
-    data = vec2mat(v)
+    data = _vec2rho(v)
+    data = 0.5 * (data + data.conj().T)
+    if ss_args['return_info']:
+        return Qobj(data, dims=dims, isherm=True), ss_args['info']
+    else:
+        return Qobj(data, dims=dims, isherm=True)
+
+
+def _sylvester_precondition(K_pre, K_post, ss_args):
+    """
+    Preconditioner that neglects the jumps in the Liouvillian and solves
+    the Sylvester equation K_pre X + X K_post = R of the effective
+    Hamiltonians, from their Schur decompositions computed once.
+    """
+    if settings.debug:
+        logger.debug('Starting Sylvester preconditioner.')
+    n = K_pre.shape[0]
+    _precond_start = time.time()
+    T, U = la.schur(K_pre.toarray(), output='complex')
+    S, Z = la.schur(K_post.toarray(), output='complex')
+    # dark states of the effective Hamiltonian make the equation singular
+    shift = 1e-3 * ss_args['weight']
+    T -= shift * np.eye(n)
+    S -= shift * np.eye(n)
+    trsyl, = la.get_lapack_funcs(('trsyl',), (T, S))
+    Uh = U.conj().T
+    Zh = Z.conj().T
+
+    def P_x(x):
+        Y, scale, _ = trsyl(T, S, Uh.dot(x.reshape((n, n))).dot(Z))
+        return U.dot(Y).dot(Zh).ravel() / scale
+
+    M = LinearOperator((n ** 2, n ** 2), matvec=P_x, dtype=complex)
+    _precond_end = time.time()
+    ss_args['info']['precond_time'] = _precond_end - _precond_start
+    return M, ss_args
+
+
+def _steadystate_matrix_free(H, c_op_list, ss_args):
+    """
+    GMRES steady state solver on the action of the Liouvillian on N x N
+    density matrices, with the unity trace condition of the LU based
+    solvers, that never assembles the Liouvillian.
+    """
+    ss_iters = {'iter': 0}
+
+    def _iter_count(r):
+        ss_iters['iter'] += 1
+        return
+
+    if not isoper(H) or len(c_op_list) == 0:
+        raise TypeError('The matrix-free method requires a Hamiltonian ' +
+                        'and a list of collapse operators.')
+    if settings.debug:
+        logger.debug('Starting matrix-free solver.')
+
+    dims = H.dims
+    n = H.shape[0]
+    K_pre, K_post, _, _ = _effective_hamiltonians(H, c_op_list)
+    action = liouvillian_action(H, c_op_list)
+    if ss_args['weight'] is None:
+        ss_args['weight'] = np.abs(K_pre.data).max()
+        ss_args['info']['weight'] = ss_args['weight']
+    weight = ss_args['weight']
+    diag = np.arange(n) * (n + 1)
+
+    # unity trace condition on the first row, as in the LU based solvers
+    def L_x(x):
+        out = action(x)
+        out[0] += weight * np.sum(x[diag])
+        return out
+
+    L = LinearOperator((n ** 2, n ** 2), matvec=L_x, dtype=complex)
+    b = np.zeros(n ** 2, dtype=complex)
+    b[0] = weight
+    if ss_args['x0'] is not None:
+        ss_args['x0'] = np.asarray(ss_args['x0'], dtype=complex).ravel()
+
+    if ss_args['M'] is None and ss_args['use_precond']:
+        ss_args['M'], ss_args = _sylvester_precondition(K_pre, K_post,
+                                                        ss_args)
+
+    _iter_start = time.time()
+    v, check = gmres(L, b, tol=ss_args['tol'], M=ss_args['M'],
+                     x0=ss_args['x0'], restart=ss_args['restart'],
+                     maxiter=ss_args['maxiter'], callback=_iter_count)
+    _iter_end = time.time()
+
+    ss_args['info']['iter_time'] = _iter_end - _iter_start
+    if ss_args['info']['precond_time'] is not None:
+        ss_args['info']['solution_time'] = (ss_args['info']['iter_time'] +
+                                            ss_args['info']['precond_time'])
+    else:
+        ss_args['info']['solution_time'] = ss_args['info']['iter_time']
+    ss_args['info']['iterations'] = ss_iters['iter']
+    if ss_args['return_info']:
+        ss_args['info']['residual_norm'] = la.norm(b - L * v, np.inf)
+
+    if settings.debug:
+        logger.debug('Number of Iterations: %i' % ss_iters['iter'])
+        logger.debug('Iteration. time: %f' % (_iter_end - _iter_start))
+
+    if check > 0:
+        raise Exception("Steadystate error: Did not reach tolerance after " +
+                        str(ss_args['maxiter']) + " steps." +
+                        "\nResidual norm: " +
+                        str(la.norm(b - L * v, np.inf)))
+    elif check < 0:
+        raise Exception(
+            "Steadystate error: Failed with fatal error: " + str(check) + ".")
+
+    data = _vec2rho(v)
     data = 0.5 * (data + data.conj().T)
     if ss_args['return_info']:
         return Qobj(data, dims=dims, isherm=True), ss_args['info']
@@ -657,7 +1003,7 @@ def _steadystate_svd_dense(L, ss_args):
     if ss_args['all_states']:
         rhoss_list = []
         for n in range(ns.shape[1]):
-            rhoss = Qobj(vec2mat(ns[:, n]), dims=L.dims[0])
+            rhoss = Qobj(_vec2rho(ns[:, n]), dims=L.dims[0])
             rhoss_list.append(rhoss / rhoss.tr())
         if ss_args['return_info']:
             return rhoss_list, ss_args['info']
@@ -667,7 +1013,7 @@ def _steadystate_svd_dense(L, ss_args):
             else:
                 return rhoss_list
     else:
-        rhoss = Qobj(vec2mat(ns[:, 0]), dims=L.dims[0])
+        rhoss = Qobj(_vec2rho(ns[:, 0]), dims=L.dims[0])
         return rhoss / rhoss.tr()
 
 
@@ -685,6 +1031,11 @@ def _steadystate_power_liouvillian(L, ss_args, has_mkl=0):
         L = L.data.tocsc() - (1e-15) * sp.eye(n, n, format='csc')
         kind = 'csc'
     orig_nnz = L.nnz
+
+    orderings = _cached_orderings(
+        _pattern_key(L, 'power', ss_args['use_wbm'], ss_args['use_rcm'],
+                     ss_args['permc_spec']), ss_args)
+    ss_args['orderings'] = orderings
     if settings.debug:
         old_band = sp_bandwidth(L)[0]
         old_pro = sp_profile(L)[0]
@@ -695,7 +1046,9 @@ def _steadystate_power_liouvillian(L, ss_args, has_mkl=0):
         if settings.debug:
             logger.debug('Calculating Weighted Bipartite Matching ordering...')
         _wbm_start = time.time()
-        perm = weighted_bipartite_matching(L)
+        if 'wbm' not in orderings:
+            orderings['wbm'] = weighted_bipartite_matching(L)
+        perm = orderings['wbm']
         _wbm_end = time.time()
         L = sp_permute(L, perm, [], kind)
         ss_args['info']['perm'].append('wbm')
@@ -711,7 +1064,9 @@ def _steadystate_power_liouvillian(L, ss_args, has_mkl=0):
             logger.debug('Calculating Reverse Cuthill-Mckee ordering...')
         ss_args['info']['perm'].append('rcm')
         _rcm_start = time.time()
-        perm2 = reverse_cuthill_mckee(L)
+        if 'rcm' not in orderings:
+            orderings['rcm'] = reverse_cuthill_mckee(L)
+        perm2 = orderings['rcm']
         _rcm_end = time.time()
         ss_args['info']['rcm_time'] = _rcm_end - _rcm_start
         rev_perm = np.argsort(perm2)
@@ -781,9 +1136,7 @@ def _steadystate_power(L, ss_args):
         if settings.has_mkl:
             lu = mkl_splu(L)
         else:
-            lu = splu(L, permc_spec=ss_args['permc_spec'],
-                      diag_pivot_thresh=ss_args['diag_pivot_thresh'],
-                      options=dict(ILU_MILU=ss_args['ILU_MILU']))
+            lu, solve = _splu_cached(L, ss_args)
 
             if settings.debug and _scipy_check:
                 L_nnz = lu.L.nnz
@@ -796,7 +1149,7 @@ def _steadystate_power(L, ss_args):
     while (la.norm(L * v, np.inf) > tol) and (it < maxiter):
 
         if ss_args['method'] == 'power':
-            v = lu.solve(v)
+            v = solve(v) if not settings.has_mkl else lu.solve(v)
         elif ss_args['method'] == 'power-gmres':
             v, check = gmres(L, v, tol=_tol, M=ss_args['M'],
                              x0=ss_args['x0'], restart=ss_args['restart'],
@@ -835,18 +1188,205 @@ def _steadystate_power(L, ss_args):
         trow = v[::rhoss.shape[0] + 1]
         data = v / np.sum(trow)
     else:
-        data = data / la.norm(v)
+        data = v / la.norm(v)
 
-    data = dense2D_to_fastcsr_fmode(
-        vec2mat(data), rhoss.shape[0], rhoss.shape[0])
-    rhoss.data = 0.5 * (data + data.H)
-    rhoss.isherm = True
+    if sflag:
+        data = _vec2rho(data)
+        rhoss = Qobj(0.5 * (data + data.conj().T), dims=rhoss.dims,
+                     isherm=True)
+    else:
+        rhoss = Qobj(data.reshape((n, 1)), dims=rhoss.dims)
     if ss_args['return_info']:
         return rhoss, ss_args['info']
     else:
         return rhoss
 
 
+def steadystate_sweep(L_family, params, method='iterative-gmres',
+                      degrade=2.0, return_info=False, **kwargs):
+    """
+    Steady states along a path of parameters, solved by an iterative method
+    warm started from the steady state at the previous point.
+
+    The iLU preconditioner is built at the first point and reused along the
+    path, until the number of iterations exceeds `degrade` times the number
+    of iterations at the point where it was built. It is then rebuilt at the
+    next point, or right away if the solver fails to converge.
+
+    Parameters
+    ----------
+    L_family : callable or LiouvillianTemplate
+        Function of the parameters returning the Liouvillian, such as a
+        LiouvillianTemplate.
+    params : list
+        Points of the path, each passed to `L_family`.
+    method : str, default = 'iterative-gmres'
+        Iterative solver: 'iterative-gmres', 'iterative-lgmres' or
+        'iterative-bicgstab'.
+    degrade : float, default = 2.0
+        Factor of increase of the number of iterations over which the
+        preconditioner is rebuilt.
+    return_info : bool, default = False
+        Return a dictionary with the iterations and timings at each point.
+    kwargs :
+        Options of `steadystate` and `build_preconditioner`, such as `tol`,
+        `use_rcm`, `use_wbm`, `drop_tol` or `fill_factor`.
+
+    Returns
+    -------
+    states : list of qobj
+        Steady state density matrices at each point.
+    info : dict, optional
+        Dictionary with the lists 'iterations', 'solution_time' and
+        'precond_time' (None where the preconditioner was reused) for each
+        point, and the total number of preconditioner builds, 'builds'.
+    """
+    if method not in ['iterative-gmres', 'iterative-lgmres',
+                      'iterative-bicgstab']:
+        raise ValueError('Invalid method argument for steadystate_sweep.')
+    for key in kwargs.keys():
+        if key in ['x0', 'M', 'use_precond', 'frame', 'blocks']:
+            raise Exception("Invalid keyword argument '" + key +
+                            "' passed to steadystate_sweep.")
+
+    info = {'iterations': [], 'solution_time': [], 'precond_time': [],
+            'builds': 0}
+    states = []
+    M = None
+    rhoss = None
+    base = None
+    for p in params:
+        L = L_family(p)
+        x0 = None if rhoss is None else rhoss.full()
+        for attempt in range(2):
+            precond_time = None
+            if M is None:
+                M, precond_info = build_preconditioner(
+                    L, method='iterative', return_info=True, **kwargs)
+                precond_time = precond_info['precond_time']
+                info['builds'] += 1
+            try:
+                rhoss, ss_info = steadystate(L, method=method, M=M, x0=x0,
+                                             return_info=True, **kwargs)
+                break
+            except Exception:
+                # a stale preconditioner gets another chance from scratch
+                if precond_time is not None:
+                    raise
+                M = None
+
+        iterations = ss_info['iterations']
+        if precond_time is not None:
+            base = max(iterations, 1)
+        elif iterations > degrade * base:
+            M = None
+        states.append(rhoss)
+        info['iterations'].append(iterations)
+        info['solution_time'].append(ss_info['iter_time'])
+        info['precond_time'].append(precond_time)
+
+    if return_info:
+        return states, info
+    else:
+        return states
+
+
+def steadystate_truncation(system, N_start=1, N_max=20, tol=1e-6,
+                           method='matrix-free', return_info=False, **kwargs):
+    """
+    Steady state with the truncation of the basis by excitation manifold
+    chosen automatically.
+
+    The steady state is solved for increasing maximum excitation manifolds
+    N, each solution embedded into the basis of the next manifold, where it
+    is the initial guess of the iterative methods, until the population of
+    the highest manifold drops below `tol`.
+
+    Parameters
+    ----------
+    system : callable
+        Function of the maximum excitation manifold N returning the basis,
+        Hamiltonian and list of collapse operators, ``(states, H, c_ops)``,
+        e.g. built on `quantum.atom_cavity.states(N)`.
+    N_start : int, default = 1
+        First maximum excitation manifold.
+    N_max : int, default = 20
+        Last maximum excitation manifold.
+    tol : float, default = 1e-6
+        Population of the highest manifold below which the truncation is
+        converged.
+    method : str, default = 'matrix-free'
+        Method of `steadystate`; the iterative methods and 'matrix-free'
+        start from the embedded solution of the previous manifold. The
+        preconditioner of 'matrix-free' is used unless `use_precond` is set.
+    return_info : bool, default = False
+        Return a dictionary with the results of every manifold.
+    kwargs :
+        Options of `steadystate`.
+
+    Returns
+    -------
+    dm : qobj
+        Steady state density matrix in the basis of manifold `N`.
+    N : int
+        Maximum excitation manifold of the converged truncation, or `N_max`.
+    info : dict, optional
+        Dictionary with the lists 'N', 'nstates', 'top_population',
+        'iterations' and 'solution_time' for every manifold solved, and the
+        final basis, 'states'.
+    """
+    if N_start > N_max:
+        raise ValueError('N_start (' + str(N_start) + ') must not exceed ' +
+                         'N_max (' + str(N_max) + ').')
+    if 'x0' in kwargs.keys():
+        raise Exception("Invalid keyword argument 'x0' passed to " +
+                        "steadystate_truncation.")
+    if method == 'matrix-free' and 'use_precond' not in kwargs.keys():
+        kwargs['use_precond'] = True
+
+    info = {'N': [], 'nstates': [], 'top_population': [], 'iterations': [],
+            'solution_time': [], 'states': None}
+    rhoss = None
+    for N in range(N_start, N_max + 1):
+        states, H, c_ops = system(N)
+        states = np.asarray(states)
+
+        # the basis of the previous manifold is contained in this one
+        x0 = None
+        if rhoss is not None:
+            rows = basis_index(states, info['states'])
+            if np.any(rows < 0):
+                raise ValueError('The basis of manifold ' + str(N - 1) +
+                                 ' is not contained in that of manifold ' +
+                                 str(N) + '.')
+            x0 = np.zeros((len(states), len(states)), dtype=complex)
+            x0[np.ix_(rows, rows)] = rhoss.full()
+
+        rhoss, ss_info = steadystate(H, c_ops, method=method, x0=x0,
+                                     return_info=True, **kwargs)
+        excitations = states.sum(axis=1)
+        top = np.real(np.sum(rhoss.diag()[excitations == excitations.max()]))
+
+        info['N'].append(N)
+        info['nstates'].append(len(states))
+        info['top_population'].append(top)
+        info['iterations'].append(ss_info['iterations'])
+        info['solution_time'].append(ss_info['solution_time'])
+        info['states'] = states
+        if settings.debug:
+            logger.debug('N = %i: top manifold population %g' % (N, top))
+        if top < tol:
+            break
+    else:
+        warnings.warn('The population of the highest manifold is ' +
+                      str(top) + ' at N_max.', UserWarning)
+
+    if return_info:
+        return rhoss, N, info
+    else:
+        return rhoss, N
+
+
 def build_preconditioner(A, c_op_list=[], **kwargs):
     """Constructs a iLU preconditioner necessary for solving for
     the steady state density matrix using the iterative linear solvers
@@ -947,13 +1487,14 @@ def _pseudo_inverse_dense(L, rhoss, w=None, **pseudo_args):
     Internal function for computing the pseudo inverse of an Liouvillian using
     dense matrix methods. See pseudo_inverse for details.
     """
-    rho_vec = np.transpose(mat2vec(rhoss.full()))
+    # row-stacked vectors, as the Liouvillian acts on them
+    rho_vec = rhoss.full().ravel()
 
     tr_mat = tensor([identity(n) for n in L.dims[0][0]])
-    tr_vec = np.transpose(mat2vec(tr_mat.full()))
     N = np.prod(L.dims[0][0])
+    tr_vec = np.identity(N).ravel()
     I = np.identity(N * N)
-    P = np.kron(np.transpose(rho_vec), tr_vec)
+    P = np.outer(rho_vec, tr_vec)
     Q = I - P
 
     if w is None:
@@ -996,12 +1537,13 @@ def _pseudo_inverse_sparse(L, rhoss, w=None, **pseudo_args):
 
     N = np.prod(L.dims[0][0])
 
-    rhoss_vec = operator_to_vector(rhoss)
+    # row-stacked vectors, as the Liouvillian acts on them
+    rhoss_vec = sp_reshape(rhoss.data, (N * N, 1))
 
     tr_op = tensor([identity(n) for n in L.dims[0][0]])
-    tr_op_vec = operator_to_vector(tr_op)
+    tr_op_vec = sp_reshape(tr_op.data, (1, N * N))
 
-    P = zcsr_kron(rhoss_vec.data, tr_op_vec.data.T)
+    P = zcsr_kron(rhoss_vec, tr_op_vec)
     I = sp.eye(N * N, N * N, format='csr')
     Q = I - P
 
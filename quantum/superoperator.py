@@ -72,13 +72,16 @@ All rights reserved.
 """
 
 
-__all__ = ['liouvillian', 'lindblad_dissipator', 'spost', 'spre', 'operator_to_vector',
-'vector_to_operator', 'mat2vec', 'vec2mat']
+__all__ = ['liouvillian', 'liouvillian_action', 'liouvillian_blocks',
+           'LiouvillianTemplate', 'hermitian_basis', 'real_liouvillian',
+           'lindblad_dissipator', 'spost', 'spre', 'operator_to_vector',
+           'vector_to_operator', 'mat2vec', 'vec2mat']
 
 
 import scipy.sparse as sp
 import numpy as np
 from scipy.sparse import kron
+from scipy.sparse.csgraph import connected_components
 # kronecker product in a sparse matrix format
 from qutip.fastsparse import fast_csr_matrix, fast_identity
 from qutip.sparse import sp_reshape
@@ -87,33 +90,424 @@ from qutip.qobj import Qobj
 from quantum.qobj import dag
 
 
-def liouvillian(H, c_ops=[]):
-# def liouvillian_ref(H, c_ops=[]):
+def liouvillian(H, c_ops=[], data_only=False):
     """Assembles the Liouvillian superoperator from a Hamiltonian
     and a `list` of collapse operators.
 
+    With the effective Hamiltonian K = H - i/2 sum_c c^dagger c, the
+    Liouvillian is written as
+    .. math::
+    -i K \\otimes 1 + i 1 \\otimes K^{\\dagger T}
+    + \\sum_c c \\otimes c^*,
+    for the vectorization used by the solvers, and all the Kronecker products
+    are accumulated in a single COO matrix that is converted to CSR once,
+    without intermediate Qobj instances.
+
     Parameters
     ----------
     H : qobj
-        System Hamiltonian.
+        System Hamiltonian or Liouvillian, or None for purely dissipative
+        dynamics.
 
     c_ops : array_like
-        A 'list' or 'array' of collapse operators.
+        A 'list' or 'array' of collapse operators. Superoperators are added
+        to the Liouvillian as they are.
+
+    data_only : bool
+        Return only the sparse matrix of the Liouvillian.
 
     Returns
     -------
     L : qobj
-        Liouvillian superoperator.
+        Liouvillian superoperator, or its sparse matrix if `data_only` is
+        True.
     """
     # \dot{\rho} = -i [H, \rho] = -i (H \rho - \rho H)
     #            =  i [\rho, H] =  i (\rho H - H \rho)
+    # effective Hamiltonian, for the products from the left and (transposed)
+    # from the right, and the superoperators added as they are
+    K_pre, K_post, jumps, supers = _effective_hamiltonians(H, c_ops,
+                                                           allow_super=True)
+    op = H if H is not None else c_ops[0]
+    op_dims = op.dims if op.isoper else op.dims[0]
+    n = K_pre.shape[0]
+
+    # triplets of all the terms, written in place into a single COO matrix
+    eye = sp.identity(n, dtype=complex, format='coo')
+    terms = [(sp.coo_matrix(K_pre), eye), (eye, sp.coo_matrix(K_post.T))]
+    terms += [(sp.coo_matrix(c), sp.coo_matrix(c.conj())) for c in jumps]
+    supers = [sp.coo_matrix(S) for S in supers]
+    nnz = [A.nnz * B.nnz for A, B in terms] + [S.nnz for S in supers]
+    offsets = np.concatenate([[0], np.cumsum(nnz)])
+
+    rows = np.empty(offsets[-1], dtype=np.int32)
+    cols = np.empty(offsets[-1], dtype=np.int32)
+    vals = np.empty(offsets[-1], dtype=complex)
+    for k, (A, B) in enumerate(terms):
+        part = slice(offsets[k], offsets[k + 1])
+        rows[part] = np.add.outer(A.row * n, B.row).ravel()
+        cols[part] = np.add.outer(A.col * n, B.col).ravel()
+        vals[part] = np.outer(A.data, B.data).ravel()
+    for k, S in enumerate(supers, len(terms)):
+        part = slice(offsets[k], offsets[k + 1])
+        rows[part] = S.row
+        cols[part] = S.col
+        vals[part] = S.data
+
+    data = sp.coo_matrix((vals, (rows, cols)), shape=(n ** 2, n ** 2)).tocsr()
+    del rows, cols, vals
+    data = fast_csr_matrix((data.data,
+                            data.indices.astype(np.int32, copy=False),
+                            data.indptr.astype(np.int32, copy=False)),
+                           shape=(n ** 2, n ** 2))
+    if data_only:
+        return data
+
+    L = Qobj()
+    L.dims = [[op_dims[0], op_dims[1]], [op_dims[0], op_dims[1]]]
+    L.data = data
+    L.isherm = False
+    L.superrep = 'super'
+    return L
+
+
+class LiouvillianTemplate(object):
+    """Liouvillian of a family of Hamiltonians and collapse operators that
+    only differ in scalar prefactors, for parameter sweeps.
+
+    The Liouvillian is linear in the prefactors h_k of the Hamiltonian
+    terms and in the rates gamma_j of the collapse operators,
+    .. math::
+    L = \\sum_k h_k L[H_k] + \\sum_j \\gamma_j D[c_j],
+    so the superoperator of every term is built once on the merged sparsity
+    pattern of all of them. A new Liouvillian is then a single dense update
+    of its data, ``data = params . data_k``. All the Liouvillians of a
+    template have the same sparsity pattern (`indices` and `indptr`), which
+    lets the solvers reuse symbolic factorizations.
+
+    Parameters
+    ----------
+    H_terms : list
+        Hamiltonian terms H_k (or Liouvillian terms, as superoperators).
+
+    c_ops : list
+        Collapse operators c_j, with unit rate, or dissipative
+        superoperators.
+
+    params : array_like, optional
+        Initial prefactors, first those of `H_terms` and then the rates of
+        `c_ops`. All ones by default.
+
+    Attributes
+    ----------
+    params : array
+        Current prefactors.
+
+    data : array
+        Complex array of shape (K, nnz) with the data of every term on the
+        merged pattern.
 
-    L = -1.0j * (spre(H) - spost(H)) # Commutation superoperator
+    Examples
+    --------
+    >>> T = LiouvillianTemplate([H0, a.dag() * sm + sm.dag() * a], [a, sm])
+    >>> for g in np.linspace(0, 1, 11):
+    ...     rho_ss = steadystate(T.update([1, g, kappa, gamma]))
+    """
+
+    def __init__(self, H_terms, c_ops=[], params=None):
+        terms = list(H_terms) + list(c_ops)
+        if len(terms) == 0:
+            raise TypeError('Either H_terms or c_ops must be given.')
+        mats = ([liouvillian(H, [], data_only=True) for H in H_terms] +
+                [liouvillian(None, [c], data_only=True) for c in c_ops])
+        pattern, self.data = _merge_pattern(mats)
+        self.indices = pattern.indices
+        self.indptr = pattern.indptr
+        self.shape = pattern.shape
+        op = terms[0]
+        op_dims = op.dims if op.isoper else op.dims[0]
+        self.dims = [[op_dims[0], op_dims[1]], [op_dims[0], op_dims[1]]]
+        self.params = np.ones(len(terms))
+        if params is not None:
+            self.update(params)
+
+    def update(self, params):
+        """Set the prefactors of the terms.
+
+        Parameters
+        ----------
+        params : array_like
+            Prefactors of the Hamiltonian terms followed by the rates of the
+            collapse operators.
+
+        Returns
+        -------
+        template : LiouvillianTemplate
+            The template itself, so that it can be passed on to a solver.
+        """
+        params = np.asarray(params, dtype=complex).ravel()
+        if len(params) != self.data.shape[0]:
+            raise ValueError('Expected %d parameters, got %d.' %
+                             (self.data.shape[0], len(params)))
+        self.params = params
+        return self
+
+    def liouvillian(self, params=None, data_only=False):
+        """Liouvillian for the given or the current prefactors.
+
+        Parameters
+        ----------
+        params : array_like, optional
+            Prefactors of the Hamiltonian terms followed by the rates of the
+            collapse operators. If given, they become the current ones.
+
+        data_only : bool
+            Return only the sparse matrix of the Liouvillian.
+
+        Returns
+        -------
+        L : qobj
+            Liouvillian superoperator, or its sparse matrix if `data_only` is
+            True.
+        """
+        if params is not None:
+            self.update(params)
+        # the solvers may prune the pattern in place, so it is not shared
+        data = fast_csr_matrix((np.dot(self.params, self.data),
+                                self.indices.copy(), self.indptr.copy()),
+                               shape=self.shape)
+        if data_only:
+            return data
+
+        L = Qobj()
+        L.dims = self.dims
+        L.data = data
+        L.isherm = False
+        L.superrep = 'super'
+        return L
+
+    __call__ = liouvillian
+
+    def __repr__(self):
+        return "LiouvillianTemplate(%d terms, %d nonzeros)" % self.data.shape
+
+
+def liouvillian_action(H, c_ops=[]):
+    """Builds the action of the Liouvillian on a vectorized density matrix
+    without assembling the superoperator.
+
+    The master equation is evaluated on the N x N matrix as
+    .. math::
+    -i [H, \\rho] - \\frac{1}{2} \\sum_c \\{c^\\dagger c, \\rho\\}
+    + \\sum_c c \\rho c^\\dagger,
+    where :math:`\\rho` is the row-major reshape of the vector, which makes
+    the result identical to ``liouvillian(H, c_ops).data * vec`` for the
+    row-stacked density matrix ``vec = rho.ravel()`` (not the column-stacked
+    `mat2vec`). Only sparse-times-dense products are needed, so memory is
+    O(N^2) instead of O(nnz(L)).
 
+    Parameters
+    ----------
+    H : qobj
+        System Hamiltonian, or None for purely dissipative dynamics.
+
+    c_ops : array_like
+        A 'list' or 'array' of collapse operators.
+
+    Returns
+    -------
+    action : function
+        Function ``action(vec)`` returning the Liouvillian applied to the
+        vectorized density matrix `vec`.
+    """
+    K_pre, K_post, c_data, _ = _effective_hamiltonians(H, c_ops)
+    n = K_pre.shape[0]
+    K_post_T = sp.csr_matrix(K_post.T)
+    c_conj = [c.conj() for c in c_data]
+
+    def action(vec):
+        rho = vec.reshape((n, n))
+        out = K_pre * rho + (K_post_T * rho.T).T
+        for c, cc in zip(c_data, c_conj):
+            out += (cc * (c * rho).T).T
+        return out.ravel()
+
+    return action
+
+
+def _effective_hamiltonians(H, c_ops, allow_super=False):
+    """
+    Effective Hamiltonians K_pre and K_post of the products of the density
+    matrix from the left and from the right, such that the Liouvillian is
+    K_pre rho + rho K_post + sum_c c rho c^dagger, the sparse data of the
+    collapse operators, and that of the superoperators among H and c_ops,
+    which are only accepted if `allow_super` is True.
+    """
+    ops = ([] if H is None else [H]) + list(c_ops)
+    if len(ops) == 0:
+        raise TypeError('Either H or c_ops must be given.')
+    for op in ops:
+        if not isinstance(op, Qobj):
+            raise TypeError('Input is not a quantum object')
+        if not (op.isoper or (allow_super and op.issuper)):
+            raise TypeError('Input is not a quantum operator')
+
+    op_dims = ops[0].dims if ops[0].isoper else ops[0].dims[0]
+    n = int(np.prod(op_dims[0]))
+    K_pre = sp.csr_matrix((n, n), dtype=complex)
+    K_post = sp.csr_matrix((n, n), dtype=complex)
+    supers = []
+    if H is not None:
+        if H.issuper:
+            supers.append(H.data)
+        else:
+            K_pre = K_pre - 1.0j * H.data
+            K_post = K_post + 1.0j * H.data
+    c_data = []
     for c in c_ops:
-        L += lindblad_dissipator(c)
+        if c.issuper:
+            supers.append(c.data)
+        else:
+            cdc = (c.dag() * c).data
+            K_pre = K_pre - 0.5 * cdc
+            K_post = K_post - 0.5 * cdc
+            c_data.append(c.data)
+    return sp.csr_matrix(K_pre), sp.csr_matrix(K_post), c_data, supers
+
+
+def liouvillian_blocks(L, charge=None):
+    """Splits a Liouvillian into the independent blocks of elements of the
+    density matrix that it couples.
+
+    If the Hamiltonian commutes with a charge Q and every collapse operator
+    changes it by a fixed amount (a weak U(1) symmetry), such as the number
+    of excitations in the bases of `quantum.atom_cavity` and
+    `quantum.coupled_cavities` with loss and pump, the Liouvillian only
+    couples the coherences |i><j| with the same difference q_i - q_j. Every
+    block can then be solved on its own, and the steady state only lives in
+    the block of the populations.
 
-    return L
+    Parameters
+    ----------
+    L : qobj
+        Liouvillian superoperator.
+
+    charge : qobj / array, optional
+        Diagonal operator, or its diagonal, with the charge of every state of
+        the basis, e.g. ``excitation_number(states)``. If not given, the
+        blocks are the connected components of the sparsity pattern of `L`,
+        which is the finest decomposition.
+
+    Returns
+    -------
+    labels : list
+        Charge difference of every block, or the index of the component if
+        no charge was given.
+
+    indices : list
+        Sorted positions of the elements of every block in the vectorized
+        density matrix, where the element (i, j) sits at i*N + j as in the
+        solvers.
+
+    blocks : list
+        Restrictions of `L` to the blocks, as CSR matrices.
+    """
+    data = sp.csr_matrix(L.data)
+    labels = _block_labels(data, charge)
+
+    keys, inv = np.unique(labels, return_inverse=True)
+    order = np.argsort(inv, kind='mergesort')
+    indices = np.split(order, np.cumsum(np.bincount(inv))[:-1])
+    blocks = [data[idx, :][:, idx] for idx in indices]
+    return list(keys), indices, blocks
+
+
+def _block_labels(data, charge=None):
+    """
+    Label of the block of every element of the vectorized density matrix for
+    the sparse Liouvillian data (see liouvillian_blocks).
+    """
+    if charge is None:
+        _, labels = connected_components(data, directed=True,
+                                         connection='weak')
+        return labels
+
+    if isinstance(charge, Qobj):
+        charge = charge.diag()
+    q = np.real(np.asarray(charge)).ravel()
+    labels = np.round(np.subtract.outer(q, q), 8).ravel()
+    A = data.tocoo()
+    nz = A.data != 0
+    if np.any(labels[A.row[nz]] != labels[A.col[nz]]):
+        raise ValueError('The Liouvillian couples elements with ' +
+                         'different charge differences.')
+    return labels
+
+
+def hermitian_basis(n):
+    """Builds the map from real coordinates of a Hermitian N x N density
+    matrix to its vectorization.
+
+    The coordinates are the N populations, followed by the real and then the
+    imaginary parts of the coherences above the diagonal, in the row-major
+    order of `numpy.triu_indices`, so that a Hermitian density matrix is
+    described by N^2 real numbers.
+
+    Parameters
+    ----------
+    n : int
+        Dimension of the Hilbert space.
+
+    Returns
+    -------
+    B : csr_matrix
+        Sparse N^2 x N^2 matrix such that ``B * x`` is the density matrix with
+        real coordinates `x`, vectorized by rows as for the Liouvillian.
+    """
+    iu, ju = np.triu_indices(n, 1)
+    m = len(iu)
+    diag = np.arange(n) * (n + 1)
+    upper = iu * n + ju
+    lower = ju * n + iu
+    rows = np.concatenate([diag, upper, lower, upper, lower])
+    cols = np.concatenate([np.arange(n), n + np.arange(m), n + np.arange(m),
+                           n + m + np.arange(m), n + m + np.arange(m)])
+    data = np.concatenate([np.ones(n + 2 * m), 1j * np.ones(m),
+                           -1j * np.ones(m)])
+    return sp.csr_matrix((data, (rows, cols)), shape=(n ** 2, n ** 2))
+
+
+def real_liouvillian(L):
+    """Transforms a Liouvillian to the real coordinates of the density
+    matrix given by `hermitian_basis`.
+
+    A Liouvillian that maps Hermitian matrices to Hermitian matrices becomes
+    a real sparse matrix, so that the master equation and the steady state
+    can be solved in real arithmetic. Any part of `L` that does not preserve
+    hermiticity, such as that of a Hamiltonian that is not exactly Hermitian
+    in a truncated basis, is dropped, which amounts to keeping the Hermitian
+    part of the Hamiltonian.
+
+    Parameters
+    ----------
+    L : qobj
+        Liouvillian superoperator.
+
+    Returns
+    -------
+    L_real : csr_matrix
+        Real sparse matrix of the Liouvillian in the real coordinates.
+    """
+    n = int(np.sqrt(L.shape[0]))
+    B = hermitian_basis(n)
+    # the columns of B are orthogonal, with squared norms 1 (populations)
+    # and 2 (coherences)
+    norms = np.ones(n ** 2)
+    norms[n:] = 0.5
+    B_inv = sp.diags(norms).dot(B.conj().T)
+    L_real = sp.csr_matrix((B_inv * L.data * B).real)
+    L_real.eliminate_zeros()
+    return L_real
 
 
 def lindblad_dissipator(a, b=None):
@@ -166,7 +560,7 @@ def spost(A):
 
     S = Qobj(isherm=A.isherm, superrep='super')
     S.dims = [[A.dims[0], A.dims[1]], [A.dims[0], A.dims[1]]]
-    S.data = zcsr_kron(fast_identity(np.prod(A.shape[0])), A.dag().data)
+    S.data = zcsr_kron(fast_identity(np.prod(A.shape[0])), A.trans().data)
     return S
 
 
@@ -240,114 +634,30 @@ def vec2mat(vec):
 #------------------------------------------------------------------------------
 
 
-
-# Under construction
-#------------------------------------------------------------------------------
-#------------------------------------------------------------------------------
-#------------------------------------------------------------------------------
-# def liouvillian(H, c_ops=[], data_only=False, chi=None):
-#     """Assembles the Liouvillian superoperator from a Hamiltonian
-#     and a 'list' of collapse operators. Like liouvillian, but with an
-#     experimental implementation which avoids creating extra Qobj instances,
-#     which can be advantageous for large systems.
-#
-#     Parameters
-#     ----------
-#     H : qobj
-#         System Hamiltonian.
-#
-#     c_ops : array_like
-#         A 'list' or 'array' of collapse operators.
-#
-#     Returns
-#     -------
-#     L : qobj
-#         Liouvillian superoperator.
-#
-#     """
-#
-#     if chi and len(chi) != len(c_ops):
-#         raise ValueError('chi must be a list with same length as c_ops')
-#
-#     if H is not None:
-#         if H.isoper:
-#             op_dims = H.dims
-#             op_shape = H.shape
-#         elif H.issuper:
-#             op_dims = H.dims[0]
-#             op_shape = [np.prod(op_dims[0]), np.prod(op_dims[0])]
-#         else:
-#             raise TypeError("Invalid type for Hamiltonian.")
-#     else:
-#         # no hamiltonian given, pick system size from a collapse operator
-#         if isinstance(c_ops, list) and len(c_ops) > 0:
-#             c = c_ops[0]
-#             if c.isoper:
-#                 op_dims = c.dims
-#                 op_shape = c.shape
-#             elif c.issuper:
-#                 op_dims = c.dims[0]
-#                 op_shape = [np.prod(op_dims[0]), np.prod(op_dims[0])]
-#             else:
-#                 raise TypeError("Invalid type for collapse operator.")
-#         else:
-#             raise TypeError("Either H or c_ops must be given.")
-#
-#     sop_dims = [[op_dims[0], op_dims[0]], [op_dims[1], op_dims[1]]]
-#     sop_shape = [np.prod(op_dims), np.prod(op_dims)]
-#
-#
-#     # L = -1.0j * (spre(H) - spost(H)) # Commutation superoperator
-#     #
-#     # spost: S.data = zcsr_kron(fast_identity(np.prod(A.shape[0])), A.dag().data)
-#     # spre:  S.data = zcsr_kron(A.data, fast_identity(np.prod(A.shape[1])))
-#
-#     spI = fast_identity(op_shape[0])
-#
-#     if H:
-#         if H.isoper:
-#             Hdg = H.dag()
-#             data = -1j*zcsr_kron(H.data, spI)
-#             data += 1j*zcsr_kron(spI, Hdg.data)
-#             # Ht = H.data.T
-#             # data = -1j * zcsr_kron(spI, H.data)
-#             # data += 1j * zcsr_kron(Ht, spI)
-#         else:
-#             data = H.data
-#     else:
-#         data = fast_csr_matrix(shape=(sop_shape[0], sop_shape[1]))
-#
-#     for idx, c_op in enumerate(c_ops):
-#         if c_op.issuper:
-#             data = data + c_op.data
-#         else:
-#             cd = c_op.data.H # Hermitian conjugate (Transpose conjugate)
-#             c = c_op.data
-#             if chi: #???
-#                 data = data + np.exp(1j * chi[idx]) * \
-#                                 zcsr_kron(c.conj(), c)
-#             else:
-#                 # data = data + zcsr_kron(c.conj(), c)
-#                 data += zcsr_kron(c, spI)*zcsr_kron(spI,cd)
-#             cdc = cd * c
-#             cdcd = cd.H
-#             # cdct = cdc.T
-#             # data = data - 0.5 * zcsr_kron(spI, cdc)
-#             # data = data - 0.5 * zcsr_kron(cdct, spI)
-#             data += -0.5 * zcsr_kron(cdc, spI)
-#             data += -0.5 * zcsr_kron(spI, cdcd)
-#
-#             # D = 0.5*( 2*spre(a)*spost(bdag) - spre(ad_b) - spost(ad_b) )
-#
-#     if data_only:
-#         return data
-#     else:
-#         L = Qobj()
-#         L.dims = sop_dims
-#         L.data = data
-#         L.isherm = False
-#         L.superrep = 'super'
-#         return L
-#------------------------------------------------------------------------------
-#------------------------------------------------------------------------------
-#------------------------------------------------------------------------------
+def _merge_pattern(mats):
+    """
+    Merge sparse matrices of the same shape onto the union of their sparsity
+    patterns. Returns a CSR matrix with that pattern and the (K, nnz) array
+    with the data of every matrix on it, so that any linear combination of
+    the matrices is obtained by updating the data of the CSR matrix in place,
+    as in ``np.dot(coeffs, data, out=L.data)``.
+    """
+    mats = [sp.csr_matrix(m) for m in mats]
+    n_row, n_col = mats[0].shape
+    keys = []
+    for m in mats:
+        m.sum_duplicates()
+        rows = np.repeat(np.arange(n_row, dtype=np.int64), np.diff(m.indptr))
+        keys.append(rows * n_col + m.indices)
+    union = np.unique(np.concatenate(keys))
+
+    data = np.zeros((len(mats), len(union)), dtype=complex)
+    for k, m in enumerate(mats):
+        data[k, np.searchsorted(union, keys[k])] = m.data
+
+    indptr = np.zeros(n_row + 1, dtype=np.int32)
+    np.cumsum(np.bincount(union // n_col, minlength=n_row), out=indptr[1:])
+    indices = (union % n_col).astype(np.int32)
+    L = sp.csr_matrix((np.zeros(len(union), dtype=complex), indices, indptr),
+                      shape=(n_row, n_col))
+    return L, data
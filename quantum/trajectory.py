@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# This file is part of Quantum.
+#
+#    Copyright (c) 2017, Diego Nicolás Bernal-García
+#    All rights reserved.
+#
+#    Redistribution and use in source and binary forms, with or without
+#    modification, are permitted provided that the following conditions are
+#    met:
+#
+#    * Redistributions of source code must retain the above copyright notice,
+#      this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#
+#    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#    "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#    LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+#    PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#    HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#    LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#    THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#    (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#    OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+"""
+This module contains the container used by the solvers to store the density
+matrices along a trajectory.
+"""
+
+__all__ = ['StateArray']
+
+
+import numpy as np
+from qutip.qobj import Qobj
+
+
+class StateArray(object):
+    """A sequence of density matrices stored in a single contiguous complex
+    array of shape (T, N, N).
+
+    Indexing returns the density matrix at a given time as a Qobj, which is
+    only created at that point, while the underlying array is available for
+    vectorized post-processing. For instance, the populations along the
+    trajectory are ``states.array.diagonal(axis1=1, axis2=2)``.
+
+    Parameters
+    ----------
+    ntimes : int
+        Number of density matrices.
+
+    dims : list
+        Dimensions of the density matrices, as in the `dims` of a Qobj.
+
+    filename : str, optional
+        If given, the array is backed by a memory-mapped file, which allows
+        storing trajectories larger than the available memory.
+
+    Attributes
+    ----------
+    array : ndarray or memmap
+        Complex array of shape (T, N, N) with the density matrices.
+
+    dims : list
+        Dimensions of the density matrices.
+
+    frame : tuple or None
+        Set by the solvers to `(r, times)` when the states were computed in
+        the frame rotating with diag(r) (see :func:`quantum.rotating_frame`):
+        `array` holds the states in the rotating frame and indexing returns
+        them in the laboratory frame. Populations are the same in both.
+    """
+
+    def __init__(self, ntimes, dims, filename=None):
+        n = int(np.prod(dims[0]))
+        shape = (ntimes, n, n)
+        if filename is None:
+            self.array = np.zeros(shape, dtype=complex)
+        else:
+            self.array = np.memmap(filename, dtype=complex, mode='w+',
+                                   shape=shape)
+        self.dims = dims
+        self.frame = None
+
+    @classmethod
+    def from_array(cls, array, dims):
+        """Wrap an existing (T, N, N) array, without copying it.
+
+        Parameters
+        ----------
+        array : ndarray
+            Complex array of shape (T, N, N) with the density matrices.
+
+        dims : list
+            Dimensions of the density matrices.
+
+        Returns
+        -------
+        states : StateArray
+            Sequence of density matrices backed by `array`.
+        """
+        states = cls.__new__(cls)
+        states.array = array
+        states.dims = dims
+        states.frame = None
+        return states
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[k] for k in range(len(self))[idx]]
+        rho = self.array[idx]
+        if self.frame is not None:
+            r, times = self.frame
+            u = np.exp(-1j * r * times[idx])
+            rho = u[:, np.newaxis] * rho * u.conj()
+        return Qobj(rho, dims=self.dims, isherm=True)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def __repr__(self):
+        return "StateArray(%d states of shape %s)" % (self.array.shape[0],
+                                                      self.array.shape[1:])